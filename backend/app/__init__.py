@@ -4,11 +4,12 @@ from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 import os
+from app.replica import RoutingSession
 
 # --- Инициализация Flask-приложения и расширений ---
 # Здесь создаются экземпляры расширений, настраивается приложение, регистрируются blueprints
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})  # Reads of @read_replica routes may use the replica
 migrate = Migrate()
 jwt = JWTManager()
 
@@ -25,11 +26,25 @@ def create_app(config_class=None):
         app.config.from_object(Config)
 
     # Initialize extensions with app
+    from app.search import include_object
+    from app import change_tracking  # noqa: F401  Adds the delete triggers to db.create_all()
+    from app.database import configure_database, setup_sqlite_connections
+    configure_database(app)
     db.init_app(app)
-    migrate.init_app(app, db)
+    migrate.init_app(app, db, include_object=include_object)
+    with app.app_context():
+        for engine in db.engines.values():
+            setup_sqlite_connections(engine, app.config)
     jwt.init_app(app)
     CORS(app)
 
+    from app.pubsub import init_broker
+    from app.user_cache import init_user_cache
+    from app.replica import init_replica
+    init_broker(app)
+    init_user_cache(app)
+    init_replica(app)
+
     # Ensure uploads directory exists
     os.makedirs(os.path.join(app.static_folder, 'uploads'), exist_ok=True)
 
@@ -37,9 +52,13 @@ def create_app(config_class=None):
     from app.auth.routes import auth_bp
     from app.documents.routes import documents_bp
     from app.messages.routes import messages_bp
+    from app.stats.routes import stats_bp
+    from app.events.routes import events_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(documents_bp, url_prefix='/api/documents')
     app.register_blueprint(messages_bp, url_prefix='/api/messages')
+    app.register_blueprint(stats_bp, url_prefix='/api/stats')
+    app.register_blueprint(events_bp, url_prefix='/api/events')
 
     return app
\ No newline at end of file
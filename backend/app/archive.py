@@ -0,0 +1,63 @@
+import os
+import zipfile
+from flask import current_app
+
+# --- Потоковая сборка ZIP-архива ---
+# Архив формируется на лету и отдаётся клиенту по частям: ни временного файла,
+# ни всего архива в памяти — в буфере только текущий кусок файла
+
+CHUNK_SIZE = 64 * 1024
+
+# Office formats and PDF are already compressed, deflating them again only costs CPU
+STORED_EXTENSIONS = {'docx', 'xlsx', 'pptx', 'pdf'}
+
+
+class _ZipStream:
+    # Write-only, unseekable file object: zipfile falls back to data descriptors,
+    # and whatever it writes is handed to the response on the next drain()
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def entry_name(document_id, file_path, file_name):
+    # The id prefix keeps names unique when several documents share a file name
+    name = (file_name or os.path.basename(file_path)).replace('\\', '/').rsplit('/', 1)[-1]
+    return f'{document_id}_{name}'
+
+
+def stream_zip(entries, upload_folder):
+    # entries: (document_id, file_path, file_name) rows the caller is allowed to read
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, 'w', allowZip64=True) as archive:
+        for document_id, file_path, file_name in entries:
+            path = os.path.join(upload_folder, file_path)
+            if not os.path.exists(path):
+                current_app.logger.warning('Skipping document %s in archive: file is missing', document_id)
+                continue
+
+            name = entry_name(document_id, file_path, file_name)
+            info = zipfile.ZipInfo.from_file(path, name)
+            extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+            info.compress_type = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+            with open(path, 'rb') as source, archive.open(info, 'w', force_zip64=True) as target:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    target.write(chunk)
+                    data = stream.drain()
+                    if data:
+                        yield data
+
+    # Last entry's data descriptor and the central directory
+    yield stream.drain()
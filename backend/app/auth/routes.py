@@ -1,11 +1,18 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from app.models import db, User
+from app.user_cache import get_user_cache
+from app.passwords import PasswordHasherBusy
 from datetime import timedelta
 
 auth_bp = Blueprint('auth', __name__)
 
 
+@auth_bp.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    return jsonify({'error': 'Server is busy, please try again'}), 503
+
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     # --- Регистрация нового пользователя ---
@@ -64,6 +71,11 @@ def login():
     if not user or not user.check_password(data['password']):
         return jsonify({'error': 'Invalid username or password'}), 401
 
+    # Hashes made with an older method or cost are upgraded while the password is at hand
+    if user.password_needs_rehash():
+        user.set_password(data['password'])
+        db.session.commit()
+
     # Generate access token
     access_token = create_access_token(
         identity=user.id,
@@ -83,12 +95,12 @@ def login():
 def profile():
     # --- Получение профиля текущего пользователя ---
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = get_user_cache().get_current(current_user_id)
 
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    return jsonify(user.to_dict()), 200
+    return jsonify(user), 200
 
 
 @auth_bp.route('/settings', methods=['PUT'])
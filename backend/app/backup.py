@@ -0,0 +1,490 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import Date, DateTime, LargeBinary, bindparam, delete, func, insert, or_, select, text, tuple_, update
+from app import db
+from app.change_tracking import tracked_tables
+from app.models import DeletedRow
+from app.storage import CHUNK_SIZE, blob_path
+
+# --- Инкрементальные резервные копии базы данных и загруженных файлов ---
+# Снимок — каталог snapshots/<id>: для каждой таблицы строки, изменённые после предыдущего снимка
+# (по индексированному updated_at или времени создания), ключи удалённых строк из журнала deleted_rows
+# и файлы этих строк. Файлы лежат в общем контентно-адресуемом хранилище files/ и копируются один раз.
+# Размер и время снимка растут с числом изменений, а не с размером базы. Восстановление проигрывает цепочку
+
+SNAPSHOTS_DIR = 'snapshots'
+STORE_DIR = 'files'
+MANIFEST = 'manifest.json'
+PARTIAL_SUFFIX = '.partial'  # A snapshot directory gets its final name only once it is complete
+RESTORED_MARKER = 'restored'  # Left by a restore: the next snapshot has to be a full one
+FETCH_BATCH = 500  # Keys per SELECT ... IN and rows per executemany
+
+# A transaction that started before a snapshot but committed after it carries an older timestamp,
+# so rows changed this long before the previous snapshot are looked at again
+CHANGE_OVERLAP = timedelta(minutes=5)
+
+# Rows of these tables are only ever inserted or deleted, their creation time marks the change
+CHANGE_COLUMNS = {'document_history': 'timestamp', 'document_history_archive': 'created_at',
+                  'document_versions': 'created_at'}
+# Extracted text is stored without touching documents.updated_at (app/extraction.py),
+# the finished job row is what changes, so its document is copied with it
+CHANGED_WITH = {'documents': ('extraction_jobs', 'document_id')}
+# Rows that point at uploaded files: (path column, hash column)
+FILE_COLUMNS = {'documents': ('file_path', 'file_hash'), 'document_versions': ('file_path', 'file_hash')}
+
+
+class BackupError(Exception):
+    pass
+
+
+def backup_root():
+    return current_app.config['BACKUP_FOLDER']
+
+
+def snapshot_path(snapshot_id):
+    return os.path.join(backup_root(), SNAPSHOTS_DIR, snapshot_id)
+
+
+def store_path(sha256, root=None):
+    return os.path.join(root or backup_root(), STORE_DIR, blob_path(sha256))
+
+
+# --- Формат данных ---
+
+def encode_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    return value
+
+
+def decode_value(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value)
+    if isinstance(column.type, LargeBinary):
+        return base64.b64decode(value)
+    return value
+
+
+def write_lines(path, items):
+    # gzip'd JSON lines; returns (count, sha256 of the file) for the manifest
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False, separators=(',', ':')) + '\n')
+            count += 1
+    return count, file_sha256(path)
+
+
+def read_lines(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def table_files(directory, table):
+    return (os.path.join(directory, f'{table.name}.rows.jsonl.gz'),
+            os.path.join(directory, f'{table.name}.deleted.jsonl.gz'))
+
+
+# --- Снимок ---
+
+@contextmanager
+def snapshot_connection():
+    # Every table and the file list are read from a single point in time
+    with db.engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            connection = connection.execution_options(isolation_level='REPEATABLE READ')
+        elif connection.dialect.name == 'sqlite':
+            connection.exec_driver_sql('BEGIN')  # pysqlite does not open a transaction for reads
+        try:
+            yield connection
+        finally:
+            connection.rollback()
+
+
+def change_column(table):
+    return table.c[CHANGE_COLUMNS.get(table.name, 'updated_at')]
+
+
+def changed_since(table, since):
+    # Rows inserted or updated after since; each change column has an index, nothing else is scanned
+    condition = change_column(table) > since
+    if table.name in CHANGED_WITH:
+        other_name, column_name = CHANGED_WITH[table.name]
+        other = db.metadata.tables[other_name]
+        key = list(table.primary_key.columns)[0]
+        condition = or_(condition, key.in_(select(other.c[column_name]).where(change_column(other) > since)))
+    return condition
+
+
+def changed_rows(connection, table, since):
+    # Every row for a full snapshot (since is None)
+    query = select(table).order_by(*table.primary_key.columns)
+    if since is not None:
+        query = query.where(changed_since(table, since))
+    yield from connection.execution_options(yield_per=FETCH_BATCH).execute(query)
+
+
+def deleted_keys(connection, since):
+    # {table name: [primary key values]} logged by the delete triggers after since
+    keys = defaultdict(dict)
+    query = (select(DeletedRow.table_name, DeletedRow.row_key).where(DeletedRow.deleted_at > since)
+             .order_by(DeletedRow.id))
+    for table_name, row_key in connection.execute(query):
+        keys[table_name][row_key] = json.loads(row_key)
+    return {table_name: list(table_keys.values()) for table_name, table_keys in keys.items()}
+
+
+def key_filter(table, keys):
+    columns = list(table.primary_key.columns)
+    if len(columns) == 1:
+        return columns[0].in_([key[0] for key in keys])
+    return tuple_(*columns).in_(keys)
+
+
+def add_file(files, file_path, file_hash):
+    # Blob files carry their hash in the row; older files are hashed when they are copied
+    if file_path:
+        files[file_path] = file_hash if file_hash and file_path == blob_path(file_hash) else files.get(file_path)
+
+
+def referenced_files(connection):
+    # Every file a document or one of its versions points at, used after a restore
+    files = {}
+    for table_name, (path_column, hash_column) in FILE_COLUMNS.items():
+        table = db.metadata.tables[table_name]
+        for file_path, file_hash in connection.execute(select(table.c[path_column], table.c[hash_column]).distinct()):
+            add_file(files, file_path, file_hash)
+    return files
+
+
+def store_file(source, sha256, root):
+    # Copies into the store, hashing on the way; returns the hash of what was actually read.
+    # Takes the backup folder explicitly so it can run in worker threads without an app context
+    target = store_path(sha256, root) if sha256 else None
+    if target and os.path.exists(target):
+        return sha256, 0
+    os.makedirs(os.path.join(root, STORE_DIR), exist_ok=True)
+    tmp_path = os.path.join(root, STORE_DIR, f'.{threading.get_ident()}.{os.path.basename(source)}.tmp')
+    digest = hashlib.sha256()
+    with open(source, 'rb') as src, open(tmp_path, 'wb') as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            dst.write(chunk)
+    actual = digest.hexdigest()
+    if sha256 and actual != sha256:
+        os.remove(tmp_path)
+        raise BackupError(f'{source}: content does not match its hash {sha256}')
+    target = store_path(actual, root)
+    if os.path.exists(target):
+        os.remove(tmp_path)
+        return actual, 0
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(tmp_path, target)
+    return actual, os.path.getsize(target)
+
+
+def backup_files(files, workers):
+    # files: {path: sha256 or None}, the files of the rows copied by this snapshot
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    root = backup_root()
+    entries, errors = [], []
+
+    def copy(path, sha256):
+        full_path = os.path.join(upload_folder, path)
+        stat = os.stat(full_path)
+        sha256, copied = store_file(full_path, sha256, root)
+        return [path, sha256, stat.st_size, int(stat.st_mtime)], copied
+
+    copied_bytes = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(path, pool.submit(copy, path, sha256)) for path, sha256 in sorted(files.items())]
+        for path, future in futures:
+            try:
+                entry, copied = future.result()
+            except (OSError, BackupError) as e:
+                errors.append(f'File {path}: {e}')
+                continue
+            entries.append(entry)
+            copied_bytes += copied
+    return entries, copied_bytes, errors
+
+
+def list_snapshots():
+    # Complete snapshots only, oldest first
+    directory = os.path.join(backup_root(), SNAPSHOTS_DIR)
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if not name.endswith(PARTIAL_SUFFIX))
+    return [load_manifest(name) for name in names if os.path.exists(os.path.join(directory, name, MANIFEST))]
+
+
+def load_manifest(snapshot_id):
+    path = os.path.join(snapshot_path(snapshot_id), MANIFEST)
+    if not os.path.exists(path):
+        raise BackupError(f'Snapshot {snapshot_id} does not exist')
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def same_schema(manifest, tables):
+    return ({table_name: info['columns'] for table_name, info in manifest['tables'].items()}
+            == {table.name: [column.name for column in table.columns] for table in tables})
+
+
+def restored_marker():
+    return os.path.join(backup_root(), RESTORED_MARKER)
+
+
+def create_snapshot(full=False, workers=4):
+    # Incremental against the latest complete snapshot unless full=True or there is none.
+    # A changed schema or a restore since that snapshot makes it a full one as well
+    tables = tracked_tables()
+    snapshots = list_snapshots()
+    parent = None if full or not snapshots or os.path.exists(restored_marker()) else snapshots[-1]
+    if parent and not same_schema(parent, tables):
+        parent = None
+    since = datetime.fromisoformat(parent['created_at']) - CHANGE_OVERLAP if parent else None
+    snapshot_id = datetime.utcnow().strftime('%Y%m%dT%H%M%S%fZ')
+    directory = snapshot_path(snapshot_id) + PARTIAL_SUFFIX
+    os.makedirs(directory)
+
+    # Taken before the read starts: whatever commits later is newer than the next snapshot's since
+    created_at = datetime.utcnow()
+    manifest = {'id': snapshot_id, 'parent': parent['id'] if parent else None,
+                'created_at': created_at.isoformat(), 'since': since.isoformat() if since else None,
+                'tables': {}, 'files': {}, 'errors': []}
+    files = {}
+    with snapshot_connection() as connection:
+        deleted = deleted_keys(connection, since) if since is not None else {}
+        for table in tables:
+            rows_path, deleted_path = table_files(directory, table)
+            path_index = hash_index = None
+            if table.name in FILE_COLUMNS:
+                path_index, hash_index = (list(table.columns).index(table.c[name]) for name in FILE_COLUMNS[table.name])
+
+            def encoded_rows():
+                for row in changed_rows(connection, table, since):
+                    if path_index is not None:
+                        add_file(files, row[path_index], row[hash_index])
+                    yield [encode_value(value) for value in row]
+
+            changed, rows_sha256 = write_lines(rows_path, encoded_rows())
+            deleted_count, deleted_sha256 = write_lines(deleted_path, deleted.get(table.name, []))
+            manifest['tables'][table.name] = {'columns': [column.name for column in table.columns],
+                                              'changed': changed, 'rows_sha256': rows_sha256,
+                                              'deleted': deleted_count, 'deleted_sha256': deleted_sha256}
+
+    entries, copied_bytes, errors = backup_files(files, workers)
+    count, files_sha256 = write_lines(os.path.join(directory, 'files.jsonl.gz'), entries)
+    manifest['files'] = {'total': count, 'copied_bytes': copied_bytes, 'sha256': files_sha256}
+    manifest['errors'] = errors
+
+    with open(os.path.join(directory, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(directory, snapshot_path(snapshot_id))
+
+    # The next snapshot only reads deletions after created_at - CHANGE_OVERLAP
+    with db.engine.begin() as connection:
+        connection.execute(delete(DeletedRow).where(DeletedRow.deleted_at <= created_at - CHANGE_OVERLAP))
+    if os.path.exists(restored_marker()):
+        os.remove(restored_marker())
+    return manifest
+
+
+def snapshot_chain(snapshot_id):
+    # Full snapshot first, the requested one last
+    chain = []
+    while snapshot_id is not None:
+        manifest = load_manifest(snapshot_id)
+        chain.append(manifest)
+        snapshot_id = manifest['parent']
+    return chain[::-1]
+
+
+def find_snapshot(at=None):
+    # Latest snapshot taken at or before the given time (UTC)
+    snapshots = [manifest for manifest in list_snapshots()
+                 if at is None or datetime.fromisoformat(manifest['created_at']) <= at]
+    if not snapshots:
+        raise BackupError('No snapshot taken at or before that time')
+    return snapshots[-1]['id']
+
+
+def chain_files(chain):
+    # {path: (sha256, size)} over the whole chain; a later snapshot has the newer copy of a path
+    files = {}
+    for manifest in chain:
+        for path, sha256, size, _ in read_lines(os.path.join(snapshot_path(manifest['id']), 'files.jsonl.gz')):
+            files[path] = (sha256, size)
+    return files
+
+
+# --- Проверка ---
+
+def verify_snapshot(snapshot_id, full=False):
+    # Returns a list of problems; full=True also re-hashes every stored file
+    problems = []
+    try:
+        chain = snapshot_chain(snapshot_id)
+    except BackupError as e:
+        return [str(e)]
+
+    for manifest in chain:
+        directory = snapshot_path(manifest['id'])
+        problems.extend(f'{manifest["id"]}: {error}' for error in manifest['errors'])
+        checks = [('files.jsonl.gz', manifest['files']['sha256'], manifest['files']['total'])]
+        for table_name, info in manifest['tables'].items():
+            checks.append((f'{table_name}.rows.jsonl.gz', info['rows_sha256'], info['changed']))
+            checks.append((f'{table_name}.deleted.jsonl.gz', info['deleted_sha256'], info['deleted']))
+        for name, sha256, count in checks:
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                problems.append(f'{manifest["id"]}: {name} is missing')
+            elif file_sha256(path) != sha256:
+                problems.append(f'{manifest["id"]}: {name} is corrupt')
+            elif sum(1 for _ in read_lines(path)) != count:
+                problems.append(f'{manifest["id"]}: {name} has a wrong number of entries')
+
+    if not problems:
+        for path, (sha256, size) in chain_files(chain).items():
+            stored = store_path(sha256)
+            if not os.path.exists(stored):
+                problems.append(f'File {path} is missing from the store')
+            elif os.path.getsize(stored) != size or (full and file_sha256(stored) != sha256):
+                problems.append(f'File {path} is corrupt in the store')
+    return problems
+
+
+# --- Восстановление ---
+
+def _upsert(connection, table, rows):
+    key = list(table.primary_key.columns)
+    positions = [list(table.columns).index(column) for column in key]
+    existing = {tuple(row) for row in connection.execute(
+        select(*key).where(key_filter(table, [tuple(row[position] for position in positions) for row in rows])))}
+    new = [row for row in rows if tuple(row[position] for position in positions) not in existing]
+    old = [row for row in rows if tuple(row[position] for position in positions) in existing]
+    names = [column.name for column in table.columns]
+    if new:
+        connection.execute(insert(table), [dict(zip(names, row)) for row in new])
+    if old:
+        # Same b_ prefix as the importer, bind names must not clash with column names
+        statement = update(table).where(*[column == bindparam(f'b_{column.name}') for column in key]).values(
+            {name: bindparam(f'b_{name}') for name in names})
+        connection.execute(statement, [{f'b_{name}': value for name, value in zip(names, row)} for row in old])
+
+
+def restore_rows(connection, table, path):
+    batch = []
+    for values in read_lines(path):
+        batch.append([decode_value(column, value) for column, value in zip(table.columns, values)])
+        if len(batch) == FETCH_BATCH:
+            _upsert(connection, table, batch)
+            batch = []
+    if batch:
+        _upsert(connection, table, batch)
+
+
+def restore_deletions(connection, table, path):
+    keys = [tuple(key) for key in read_lines(path)]
+    for start in range(0, len(keys), FETCH_BATCH):
+        connection.execute(delete(table).where(key_filter(table, keys[start:start + FETCH_BATCH])))
+
+
+def restore_snapshot(snapshot_id, clear=False, files=True):
+    # Replays the chain into the configured database in one transaction, then copies the files.
+    # The schema must already exist (flask db upgrade); the tables must be empty unless clear=True
+    problems = verify_snapshot(snapshot_id)
+    if problems:
+        raise BackupError(f'Snapshot {snapshot_id} failed verification: {problems[0]}')
+    chain = snapshot_chain(snapshot_id)
+    tables = tracked_tables()
+
+    with db.engine.begin() as connection:
+        if clear:
+            for table in reversed(db.metadata.sorted_tables):
+                connection.execute(delete(table))
+        elif any(connection.execute(select(func.count()).select_from(table)).scalar()
+                 for table in db.metadata.sorted_tables):
+            raise BackupError('The database is not empty, restore with clear=True to replace its contents')
+
+        for manifest in chain:
+            if not same_schema(manifest, tables):
+                raise BackupError(f'Snapshot {manifest["id"]} has a different schema')
+            directory = snapshot_path(manifest['id'])
+            # Deletions first, children before their parents: a key deleted and inserted
+            # again within one snapshot ends up with the copied row
+            for table in reversed(tables):
+                restore_deletions(connection, table, table_files(directory, table)[1])
+            for table in tables:
+                restore_rows(connection, table, table_files(directory, table)[0])
+
+        # The deletions logged while clearing and replaying belong to no snapshot
+        connection.execute(delete(DeletedRow))
+
+        if connection.dialect.name == 'postgresql':
+            # Rows were inserted with explicit ids, the sequences have to catch up
+            for table in tables:
+                key = list(table.primary_key.columns)
+                if len(key) == 1 and key[0].autoincrement is not False and isinstance(key[0].type, db.Integer):
+                    connection.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{table.name}', '{key[0].name}'), "
+                        f"COALESCE((SELECT MAX({key[0].name}) FROM {table.name}), 0) + 1, false)"))
+
+    # Restored rows keep their old timestamps, which a snapshot against the latest one would miss
+    with open(restored_marker(), 'w', encoding='utf-8') as f:
+        f.write(snapshot_id)
+
+    if files:
+        return restore_files(chain)
+    return 0
+
+
+def restore_files(chain):
+    # Copies the files of the restored rows that are missing or differ in size; returns how many were copied
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    stored = chain_files(chain)
+    with db.engine.connect() as connection:
+        paths = sorted(referenced_files(connection))
+
+    restored, missing = 0, []
+    for path in paths:
+        if path not in stored:
+            missing.append(path)
+            continue
+        sha256, size = stored[path]
+        target = os.path.join(upload_folder, path)
+        if os.path.exists(target) and os.path.getsize(target) == size:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(store_path(sha256), target + '.restoring')
+        os.replace(target + '.restoring', target)
+        restored += 1
+    if missing:
+        raise BackupError(f'{len(missing)} files are not in the backup, e.g. {missing[0]}')
+    return restored
@@ -0,0 +1,60 @@
+from sqlalchemy import event
+from app import db
+
+# --- Журнал удалённых строк ---
+# Изменённые строки резервная копия находит по updated_at (или времени создания), а удалённые —
+# по таблице deleted_rows, которую заполняет триггер AFTER DELETE на каждой отслеживаемой таблице.
+# Триггеры создаются миграцией и db.create_all(); пересоздание таблицы в batch-миграции SQLite
+# удаляет их, поэтому такая миграция должна создать их заново
+
+# Tables that are not backed up: the log itself and the short-lived read-your-writes marks
+UNTRACKED_TABLES = {'deleted_rows', 'user_writes'}
+
+POSTGRES_FUNCTION = """CREATE OR REPLACE FUNCTION record_deleted_row() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO deleted_rows (table_name, row_key, deleted_at)
+    SELECT TG_TABLE_NAME, json_agg(to_jsonb(OLD) -> key.name ORDER BY key.position)::text,
+           now() AT TIME ZONE 'utc'
+    FROM unnest(TG_ARGV) WITH ORDINALITY AS key(name, position);
+    RETURN OLD;
+END
+$$ LANGUAGE plpgsql"""
+
+
+def tracked_tables(metadata=None):
+    return [table for table in (metadata or db.metadata).sorted_tables if table.name not in UNTRACKED_TABLES]
+
+
+def trigger_ddl(dialect, tables):
+    # tables: [(table name, [primary key column names])]
+    if dialect == 'sqlite':
+        # %f000 writes microseconds, the same text format SQLAlchemy uses for DateTime columns
+        return [f"""CREATE TRIGGER IF NOT EXISTS {name}_deleted AFTER DELETE ON {name} BEGIN
+            INSERT INTO deleted_rows (table_name, row_key, deleted_at)
+            VALUES ('{name}', json_array({', '.join(f'old.{column}' for column in key)}),
+                    strftime('%Y-%m-%d %H:%M:%f000', 'now'));
+        END""" for name, key in tables]
+    if dialect == 'postgresql':
+        statements = [POSTGRES_FUNCTION]
+        for name, key in tables:
+            arguments = ', '.join(f"'{column}'" for column in key)
+            statements += [f'DROP TRIGGER IF EXISTS {name}_deleted ON {name}',
+                           f'CREATE TRIGGER {name}_deleted AFTER DELETE ON {name} '
+                           f'FOR EACH ROW EXECUTE FUNCTION record_deleted_row({arguments})']
+        return statements
+    return []
+
+
+def create_triggers(connection, tables=None):
+    tables = tables if tables is not None else tracked_tables()
+    keys = [(table.name, [column.name for column in table.primary_key.columns]) for table in tables]
+    for statement in trigger_ddl(connection.dialect.name, keys):
+        connection.exec_driver_sql(statement)
+
+
+def _metadata_created(metadata, connection, **kw):
+    create_triggers(connection, tracked_tables(metadata))
+
+
+# Databases created through db.create_all() get the triggers as well
+event.listen(db.metadata, 'after_create', _metadata_created)
@@ -0,0 +1,87 @@
+from flask import current_app, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# --- Настройка подключения к базе данных ---
+# Параметры пула и таймаутов берутся из конфигурации (переменных окружения).
+# Для SQLite при каждом подключении включаются WAL, synchronous=NORMAL и ожидание
+# блокировки, чтобы параллельные процессы gunicorn не получали "database is locked".
+# Ограничение времени запроса PostgreSQL действует только в транзакциях HTTP-запросов
+
+
+def normalize_database_url(url):
+    # Some hosting providers still hand out the old postgres:// scheme. Without an explicit
+    # driver newer SQLAlchemy picks psycopg 3, while requirements.txt ships psycopg2
+    for scheme in ('postgres://', 'postgresql://'):
+        if url.startswith(scheme):
+            return 'postgresql+psycopg2://' + url[len(scheme):]
+    return url
+
+
+def engine_options(config, url):
+    # Defaults match Config, so configs that do not subclass it still get a working engine
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        options = {'connect_args': {'timeout': config.get('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000}}
+        # In-memory databases live in a single connection, there is no pool to size
+        if url.database and url.database != ':memory:':
+            options.update(pool_size=config.get('DB_POOL_SIZE', 5), max_overflow=config.get('DB_MAX_OVERFLOW', 10),
+                           pool_timeout=config.get('DB_POOL_TIMEOUT', 30))
+        return options
+
+    options = {
+        'pool_size': config.get('DB_POOL_SIZE', 5),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+    }
+    if url.get_backend_name() == 'postgresql':
+        options['connect_args'] = {'connect_timeout': config.get('DB_CONNECT_TIMEOUT', 10)}
+    return options
+
+
+def configure_database(app):
+    # Called before db.init_app; options set explicitly in the config are kept
+    app.config['SQLALCHEMY_DATABASE_URI'] = normalize_database_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config, app.config['SQLALCHEMY_DATABASE_URI'])
+
+    # Optional read replica, an extra bind that no model is attached to; routing is in app/replica.py
+    replica_url = app.config.get('REPLICA_DATABASE_URI')
+    if replica_url:
+        replica_url = normalize_database_url(replica_url)
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds['replica'] = {'url': replica_url, **engine_options(app.config, replica_url)}
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def setup_sqlite_connections(engine, config):
+    # Called for every engine after db.init_app
+    if engine.dialect.name != 'sqlite':
+        return
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if engine.url.database and engine.url.database != ':memory:':
+            # Readers no longer block the writer and the writer no longer blocks readers
+            cursor.execute('PRAGMA journal_mode=WAL')
+        # Safe with WAL: a power loss may drop the last commits but never corrupts the file
+        cursor.execute(f'PRAGMA synchronous={config.get("SQLITE_SYNCHRONOUS", "NORMAL")}')
+        cursor.execute(f'PRAGMA busy_timeout={int(config.get("SQLITE_BUSY_TIMEOUT_MS", 5000))}')
+        cursor.close()
+
+    event.listen(engine, 'connect', on_connect)
+
+
+def limit_request_statements(session, transaction, connection):
+    # A runaway query in a request is cancelled by the server instead of holding a connection
+    # forever. SET LOCAL ends with the transaction, so migrations and the maintenance scripts,
+    # which run outside a request on the same pool, are never cut off
+    if connection.dialect.name == 'postgresql' and has_request_context():
+        timeout = int(current_app.config.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {timeout}')
+
+
+event.listen(Session, 'after_begin', limit_request_statements)
@@ -0,0 +1,60 @@
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Document, DocumentStat
+
+# --- Поддержка сводной статистики документов ---
+# Каждое изменение документа добавляет или вычитает единицу в строке
+# (автор, статус, тип) в той же транзакции, что и само изменение
+
+
+def stat_key(author_id, status, document_type):
+    return author_id, status or '', document_type
+
+
+def count_documents(changes):
+    # changes: stat_key(...) -> delta mapping; runs in the caller's transaction
+    for (author_id, status, document_type), delta in changes.items():
+        if delta:
+            _adjust(author_id, status, document_type, delta)
+
+
+def count_document(author_id, status, document_type, delta=1):
+    count_documents({stat_key(author_id, status, document_type): delta})
+
+
+def move_document(old_key, new_key):
+    # A document changed status or type: one row loses it, another gains it
+    if old_key != new_key:
+        count_documents({old_key: -1, new_key: 1})
+
+
+def _adjust(author_id, status, document_type, delta):
+    condition = (DocumentStat.author_id == author_id, DocumentStat.status == status,
+                 DocumentStat.type == document_type)
+    for _ in range(2):
+        result = db.session.execute(
+            update(DocumentStat).where(*condition).values(count=DocumentStat.count + delta)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(DocumentStat(author_id=author_id, status=status, type=document_type, count=delta))
+            return
+        except IntegrityError:
+            # Another request created the row first; add our delta to it
+            continue
+    raise RuntimeError(f'Could not update document stats for {author_id}/{status}/{document_type}')
+
+
+def rebuild_stats():
+    # Recounts everything from the documents table in a single transaction
+    status = func.coalesce(Document.status, '')
+    counts = select(Document.author_id, status, Document.type, func.count(Document.id)) \
+        .group_by(Document.author_id, status, Document.type)
+    db.session.execute(delete(DocumentStat))
+    db.session.execute(insert(DocumentStat).from_select(['author_id', 'status', 'type', 'count'], counts))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(DocumentStat).scalar()
@@ -1,24 +1,51 @@
+import difflib
 import os
-from flask import Blueprint, request, jsonify, current_app, send_from_directory
+import re
+import uuid
+from collections import Counter
+from zipfile import BadZipFile
+from flask import Blueprint, request, jsonify, current_app, send_from_directory, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from werkzeug.utils import secure_filename
-from app.models import db, Document, DocumentHistory, User
-from datetime import datetime
+from sqlalchemy import func, insert, literal_column, update
+from sqlalchemy.orm import load_only
+from app.models import (db, Document, DocumentHistory, DocumentVersion, UploadSession, serialize_documents,
+                        serialize_versions)
+from app.pagination import paginate, parse_limit
+from app.search import search_documents
+from app.history_archive import paginate_history
+from app.extraction import enqueue_extraction, extract_text, UnsupportedFormat
+from app.archive import stream_zip
+from app.pubsub import publish
+from app.user_cache import get_user_cache
+from app.replica import read_replica
+from app.document_stats import stat_key, count_document, count_documents, move_document
+from app.importer import parse_manifest, open_zip_member, zip_member_names, import_documents
+from app.storage import (save_upload, spool_stream, store_file, acquire_blob, partial_upload_path, write_chunk,
+                         hash_file)
 
 documents_bp = Blueprint('documents', __name__)
 
 ALLOWED_EXTENSIONS = {'doc', 'docx', 'pdf', 'txt', 'xlsx', 'xls', 'ppt', 'pptx'}
+SORTABLE_FIELDS = {'id', 'title', 'type', 'status', 'created_at', 'updated_at'}
+MAX_BULK_IDS = 1000
 
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-@documents_bp.route('', methods=['GET'])
-@jwt_required()
-def get_documents():
+def is_archive(filename):
+    return filename.lower().endswith('.zip')
+
+
+def original_filename(filename):
+    # Kept as metadata only (download name, format detection); never used as a path
+    return filename.replace('\\', '/').rsplit('/', 1)[-1][:255]
+
+
+def filter_documents(query):
+    # Request filters shared by the listing and the ZIP archive
     current_user_id = get_jwt_identity()
-    query = Document.query
 
     # Filter by type if specified
     document_type = request.args.get('type')
@@ -33,26 +60,163 @@ def get_documents():
     # Filter by performer (author) if specified
     performer = request.args.get('performer')
     if performer:
-        user = User.query.filter_by(username=performer).first()
+        user = get_user_cache().get_by_username(performer)
         if user:
-            query = query.filter_by(author_id=user.id)
+            query = query.filter_by(author_id=user['id'])
 
     # Non-admin users can only see their own documents
     claims = get_jwt()
     if claims.get('role') != 'admin':
         query = query.filter_by(author_id=current_user_id)
 
+    return query
+
+
+@documents_bp.route('', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_documents():
+    query = filter_documents(Document.query)
+
     # Sort if specified
     sort_by = request.args.get('sort_by', 'created_at')
     sort_dir = request.args.get('sort_dir', 'desc')
 
-    if sort_dir == 'desc':
-        query = query.order_by(getattr(Document, sort_by).desc())
+    if sort_by not in SORTABLE_FIELDS:
+        return jsonify({'error': f'Invalid sort field. Allowed fields: {", ".join(sorted(SORTABLE_FIELDS))}'}), 400
+
+    # Sparse fieldset: only the requested columns are selected,
+    # the content column is left out of the listing unless asked for
+    fields = request.args.get('fields')
+    if fields:
+        fields = ['id'] + [f.strip() for f in fields.split(',') if f.strip() and f.strip() != 'id']
+        unknown = set(fields) - set(Document.FIELDS)
+        if unknown:
+            return jsonify({'error': f'Invalid fields: {", ".join(sorted(unknown))}'}), 400
     else:
-        query = query.order_by(getattr(Document, sort_by))
+        fields = Document.SUMMARY_FIELDS
+    query = query.options(load_only(*Document.columns_for(list(fields) + [sort_by])))
+
+    # Keyset pagination: page N costs the same as page 1
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        documents, next_cursor = paginate(query, Document, sort_by, sort_dir, limit,
+                                          request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'items': serialize_documents(documents, fields),
+        'next_cursor': next_cursor
+    }), 200
+
+
+@documents_bp.route('/archive', methods=['GET'])
+@jwt_required()
+def get_archive():
+    # Either explicit ids (?ids=1,2,3) or the same filters as the listing
+    query = filter_documents(Document.query)
+    ids = request.args.get('ids')
+    if ids:
+        try:
+            ids = [int(i) for i in ids.split(',') if i.strip()]
+        except ValueError:
+            return jsonify({'error': 'Invalid ids'}), 400
+        query = query.filter(Document.id.in_(ids))
+
+    # filter_documents already limits non-admins to their own documents, so every entry
+    # passes the same author/admin check as get_document_file; only paths are loaded
+    entries = query.with_entities(Document.id, Document.file_path, Document.file_name) \
+        .order_by(Document.id).all()
+    if not entries:
+        return jsonify({'error': 'No documents found'}), 404
+
+    response = current_app.response_class(
+        stream_with_context(stream_zip(entries, current_app.config['UPLOAD_FOLDER'])),
+        mimetype='application/zip'
+    )
+    response.headers.set('Content-Disposition', 'attachment', filename='documents.zip')
+    return response
+
+
+def pending_documents(query):
+    # status is inlined as a literal, not a bound parameter, so the planner can match
+    # it against the WHERE clause of the partial index ix_documents_pending_type_created_at
+    query = query.filter(Document.status == literal_column("'pending'"))
+
+    document_type = request.args.get('type')
+    if document_type:
+        query = query.filter(Document.type == document_type)
+
+    # Non-admin users only see their own documents in the queue
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        query = query.filter(Document.author_id == get_jwt_identity())
+
+    return query
+
+
+@documents_bp.route('/pending', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_pending_documents():
+    # Approval queue: oldest first, so documents are reviewed in the order they were submitted
+    query = pending_documents(Document.query).options(
+        load_only(*Document.columns_for(Document.SUMMARY_FIELDS))
+    )
+
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        documents, next_cursor = paginate(query, Document, 'created_at', 'asc', limit,
+                                          request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'items': serialize_documents(documents, Document.SUMMARY_FIELDS),
+        'next_cursor': next_cursor
+    }), 200
+
+
+@documents_bp.route('/pending/count', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_pending_count():
+    # A range count over the pending entries of an index, documents is never scanned
+    count = pending_documents(db.session.query(func.count(Document.id))).scalar()
+    return jsonify({'count': count}), 200
 
-    documents = query.all()
-    return jsonify([doc.to_dict() for doc in documents]), 200
+
+@documents_bp.route('/search', methods=['GET'])
+@jwt_required()
+@read_replica
+def search():
+    current_user_id = get_jwt_identity()
+    claims = get_jwt()
+
+    query_text = request.args.get('q', '').strip()
+    if not query_text:
+        return jsonify({'error': 'Search query is required'}), 400
+
+    try:
+        limit = parse_limit(request.args.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Non-admin users can only find their own documents
+    author_id = None if claims.get('role') == 'admin' else current_user_id
+    matches = search_documents(query_text, limit, author_id)
+
+    ranks = dict(matches)
+    documents = Document.query.options(
+        load_only(*Document.columns_for(Document.SUMMARY_FIELDS))
+    ).filter(Document.id.in_(ranks)).all()
+    documents.sort(key=lambda doc: ranks[doc.id], reverse=True)
+
+    items = serialize_documents(documents, Document.SUMMARY_FIELDS)
+    for item in items:
+        item['rank'] = ranks[item['id']]
+    return jsonify({'items': items}), 200
 
 
 @documents_bp.route('/<int:document_id>', methods=['GET'])
@@ -99,19 +263,30 @@ def create_document():
     if not title:
         return jsonify({'error': 'Title is required'}), 400
 
-    # Save the file
-    filename = secure_filename(file.filename)
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    unique_filename = f"{timestamp}_{filename}"
-    file_path = os.path.join(upload_folder, unique_filename)
-    file.save(file_path)
+    # Save the file; identical content is stored only once
+    file_hash, file_size, file_path = save_upload(file)
+    document = add_document(title, document_type, original_filename(file.filename),
+                            file_hash, file_size, file_path, current_user_id)
+    db.session.commit()
+
+    return jsonify({
+        'message': 'Document created successfully',
+        'document': document.to_dict()
+    }), 201
+
+
+def add_document(title, document_type, file_name, file_hash, file_size, file_path, user_id):
+    # Adds a document for an already stored blob to the session; the caller commits
+    acquire_blob(file_hash, file_size)
 
     # Create document record
     document = Document(
         title=title,
         type=document_type,
-        file_path=unique_filename,
-        author_id=current_user_id,
+        file_path=file_path,
+        file_name=file_name,
+        file_hash=file_hash,
+        author_id=user_id,
         status='draft'
     )
 
@@ -122,10 +297,153 @@ def create_document():
     history = DocumentHistory(
         document_id=document.id,
         action='created',
-        user_id=current_user_id
+        user_id=user_id
     )
 
     db.session.add(history)
+    add_version(document, 1, file_size, user_id)
+    count_document(user_id, document.status, document_type)
+
+    # Text is extracted by the background worker, the upload returns right away
+    enqueue_extraction(document)
+    return document
+
+
+def add_version(document, version, file_size, user_id):
+    # Records the document's current file as a version; the blob reference acquired
+    # for the file belongs to this version and is kept as long as the version exists
+    db.session.add(DocumentVersion(
+        document_id=document.id,
+        version=version,
+        file_path=document.file_path,
+        file_name=document.file_name,
+        file_hash=document.file_hash,
+        file_size=file_size,
+        author_id=user_id
+    ))
+
+
+# --- Загрузка больших файлов по частям ---
+# POST /uploads создаёт сессию, PUT /uploads/<id> дописывает часть (заголовок Content-Range),
+# GET /uploads/<id> сообщает, сколько байт уже получено, POST /uploads/<id>/complete создаёт документ
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+def get_upload_session(upload_id):
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != get_jwt_identity():
+        return None
+    return upload
+
+
+@documents_bp.route('/uploads', methods=['POST'])
+@jwt_required()
+def initiate_upload():
+    current_user_id = get_jwt_identity()
+    data = request.get_json()
+
+    if not data or not data.get('title') or not data.get('file_name') or data.get('size') is None:
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    # A ZIP archive can be uploaded this way too, to be fed to the bulk import
+    file_name = original_filename(data['file_name'])
+    if not allowed_file(file_name) and not is_archive(file_name):
+        return jsonify({'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
+
+    size = data['size']
+    if not isinstance(size, int) or size < 0 or size > current_app.config['MAX_UPLOAD_SIZE']:
+        return jsonify({'error': 'Invalid file size'}), 400
+
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=current_user_id,
+        title=data['title'],
+        type=data.get('type', 'general'),
+        file_name=file_name,
+        size=size,
+        received=0
+    )
+    db.session.add(upload)
+    db.session.commit()
+
+    return jsonify(upload.to_dict()), 201
+
+
+@documents_bp.route('/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_upload(upload_id):
+    upload = get_upload_session(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    return jsonify(upload.to_dict()), 200
+
+
+@documents_bp.route('/uploads/<upload_id>', methods=['PUT'])
+@jwt_required()
+def upload_chunk(upload_id):
+    upload = get_upload_session(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    if upload.document_id is not None:
+        return jsonify({'error': 'Upload already completed'}), 409
+
+    match = CONTENT_RANGE_RE.match(request.headers.get('Content-Range', ''))
+    if not match:
+        return jsonify({'error': 'Content-Range header is required'}), 400
+
+    start, end = int(match.group(1)), int(match.group(2))
+    if end < start or end >= upload.size:
+        return jsonify({'error': 'Invalid Content-Range'}), 416
+
+    # A chunk may repeat bytes already received (a retried request) but must not leave a gap
+    if start > upload.received:
+        return jsonify({'error': 'Chunk does not continue the upload', 'received': upload.received}), 409
+
+    # The body is streamed to disk in small pieces, never loaded into memory as a whole
+    try:
+        written = write_chunk(partial_upload_path(upload.id), request.stream, start, end - start + 1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    upload.received = max(upload.received, start + written)
+    db.session.commit()
+
+    return jsonify(upload.to_dict()), 200
+
+
+@documents_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload(upload_id):
+    upload = get_upload_session(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    # Completing twice returns the same document
+    if upload.document_id is not None:
+        document = db.session.get(Document, upload.document_id)
+        return jsonify({
+            'message': 'Document created successfully',
+            'document': document.to_dict()
+        }), 200
+
+    if is_archive(upload.file_name):
+        return jsonify({'error': 'Archives are imported through /api/documents/import'}), 400
+
+    path = partial_upload_path(upload.id)
+    if upload.received != upload.size or (upload.size and not os.path.exists(path)):
+        return jsonify({'error': 'Upload is incomplete', 'received': upload.received}), 409
+
+    if not os.path.exists(path):
+        open(path, 'wb').close()  # Empty file: no chunks were sent
+
+    file_hash = hash_file(path)
+    file_path = store_file(path, file_hash)
+    document = add_document(upload.title, upload.type, upload.file_name,
+                            file_hash, upload.size, file_path, upload.user_id)
+    upload.document_id = document.id
     db.session.commit()
 
     return jsonify({
@@ -134,6 +452,106 @@ def create_document():
     }), 201
 
 
+@documents_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def abort_upload(upload_id):
+    upload = get_upload_session(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    if upload.document_id is None:
+        path = partial_upload_path(upload.id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    db.session.delete(upload)
+    db.session.commit()
+
+    return jsonify({'message': 'Upload cancelled'}), 200
+
+
+# --- Массовый импорт ---
+# Принимает ZIP-архив (поле archive или завершённую загрузку по частям upload_id)
+# либо несколько файлов (поле files) и необязательный манифест с названиями и типами
+
+@documents_bp.route('/import', methods=['POST'])
+@jwt_required()
+def bulk_import():
+    current_user_id = get_jwt_identity()
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    data = request.get_json(silent=True) or request.form
+    archive_path = None
+    upload = None
+    consumed = False  # A finished upload is kept for a retry until its archive and manifest are accepted
+    spooled = {}
+
+    if data.get('upload_id'):
+        upload = get_upload_session(data['upload_id'])
+        if upload is None:
+            return jsonify({'error': 'Upload not found'}), 404
+        if not is_archive(upload.file_name) or upload.received != upload.size:
+            return jsonify({'error': 'Upload is not a complete ZIP archive'}), 400
+        archive_path = partial_upload_path(upload.id)
+    elif 'archive' in request.files:
+        # The archive is spooled to disk once so that worker threads can each open it
+        archive_path = spool_stream(request.files['archive'].stream, upload_folder)
+
+    try:
+        if archive_path:
+            try:
+                names = zip_member_names(archive_path)
+            except BadZipFile:
+                return jsonify({'error': 'Invalid ZIP archive'}), 400
+
+            def open_source(name):
+                return open_zip_member(archive_path, name)
+        else:
+            # Spooled like the archive: the manifest may list a file twice, and every
+            # worker thread needs its own file handle rather than the shared request stream
+            for file in request.files.getlist('files'):
+                if file.filename not in spooled:
+                    spooled[file.filename] = spool_stream(file.stream, upload_folder)
+            if not spooled:
+                return jsonify({'error': 'No files to import'}), 400
+            names = list(spooled)
+
+            def open_source(name):
+                return open(spooled[name], 'rb')
+
+        try:
+            items = parse_manifest(data.get('manifest'), names)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid manifest: {e}'}), 400
+
+        consumed = True
+        results = import_documents(
+            items, open_source, upload_folder, current_user_id, allowed_file,
+            workers=current_app.config['IMPORT_WORKERS'],
+            batch_size=current_app.config['IMPORT_BATCH_SIZE']
+        )
+    finally:
+        # The archive itself is not kept, only the files extracted from it. A resumable
+        # upload that was rejected stays, so the client can retry without sending it again
+        if upload is not None:
+            if consumed:
+                if os.path.exists(archive_path):
+                    os.remove(archive_path)
+                db.session.delete(upload)
+                db.session.commit()
+        elif archive_path and os.path.exists(archive_path):
+            os.remove(archive_path)
+        for path in spooled.values():
+            os.remove(path)
+
+    created = sum(1 for result in results if result['status'] == 'created')
+    return jsonify({
+        'message': f'Imported {created} of {len(results)} documents',
+        'created': created,
+        'failed': len(results) - created,
+        'results': results
+    }), 200
+
+
 @documents_bp.route('/<int:document_id>', methods=['PUT'])
 @jwt_required()
 def update_document(document_id):
@@ -148,6 +566,7 @@ def update_document(document_id):
 
     # Get form data
     data = request.form.to_dict()
+    old_stat_key = stat_key(document.author_id, document.status, document.type)
 
     # Update document fields
     if 'title' in data:
@@ -167,21 +586,20 @@ def update_document(document_id):
             return jsonify({'error': f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
 
         # Save the new file
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        unique_filename = f"{timestamp}_{filename}"
-
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        file_path = os.path.join(upload_folder, unique_filename)
-        file.save(file_path)
+        file_hash, file_size, file_path = save_upload(file)
 
-        # Delete old file if it exists
-        if document.file_path:
-            old_file_path = os.path.join(upload_folder, document.file_path)
-            if os.path.exists(old_file_path):
-                os.remove(old_file_path)
+        # The previous file stays in the store as an older version.
+        # Re-uploading identical content creates no version and keeps the extracted text
+        if file_path != document.file_path:
+            acquire_blob(file_hash, file_size)
+            document.file_path = file_path
+            document.file_name = original_filename(file.filename)
+            document.file_hash = file_hash
 
-        document.file_path = unique_filename
+            latest = db.session.query(func.max(DocumentVersion.version)) \
+                .filter(DocumentVersion.document_id == document.id).scalar()
+            add_version(document, (latest or 0) + 1, file_size, current_user_id)
+            enqueue_extraction(document)
 
     # Add document history
     history = DocumentHistory(
@@ -192,8 +610,11 @@ def update_document(document_id):
     )
 
     db.session.add(history)
+    move_document(old_stat_key, stat_key(document.author_id, document.status, document.type))
     db.session.commit()
 
+    publish([document.author_id], 'document_updated', document.to_dict(fields=Document.SUMMARY_FIELDS))
+
     return jsonify({
         'message': 'Document updated successfully',
         'document': document.to_dict()
@@ -216,6 +637,7 @@ def update_document_status(document_id):
     if not data or 'status' not in data:
         return jsonify({'error': 'Status is required'}), 400
 
+    old_stat_key = stat_key(document.author_id, document.status, document.type)
     document.status = data['status']
 
     # Add document history
@@ -227,14 +649,74 @@ def update_document_status(document_id):
     )
 
     db.session.add(history)
+    move_document(old_stat_key, stat_key(document.author_id, document.status, document.type))
     db.session.commit()
 
+    publish([document.author_id], 'document_status', {'id': document.id, 'status': document.status})
+
     return jsonify({
         'message': 'Document status updated successfully',
         'document': document.to_dict()
     }), 200
 
 
+@documents_bp.route('/status', methods=['PUT'])
+@jwt_required()
+def bulk_update_status():
+    current_user_id = get_jwt_identity()
+    claims = get_jwt()
+
+    # Only admins can change document status
+    if claims.get('role') != 'admin':
+        return jsonify({'error': 'Permission denied'}), 403
+
+    data = request.get_json()
+
+    if not data or 'status' not in data or not isinstance(data.get('ids'), list):
+        return jsonify({'error': 'Status and a list of ids are required'}), 400
+
+    if not all(isinstance(i, int) for i in data['ids']):
+        return jsonify({'error': 'Invalid ids'}), 400
+
+    if len(data['ids']) > MAX_BULK_IDS:
+        return jsonify({'error': f'At most {MAX_BULK_IDS} documents can be updated at once'}), 400
+
+    # One query finds which of the requested documents exist, with what the stats need
+    ids = list(dict.fromkeys(data['ids']))
+    rows = db.session.query(Document.id, Document.author_id, Document.status, Document.type) \
+        .filter(Document.id.in_(ids)).all()
+    found = {row.id for row in rows}
+
+    # One UPDATE for all documents and one multi-row INSERT for their history
+    if found:
+        db.session.execute(
+            update(Document).where(Document.id.in_(found)).values(status=data['status'])
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(insert(DocumentHistory), [{
+            'document_id': document_id,
+            'action': f'status_changed_to_{data["status"]}',
+            'user_id': current_user_id,
+            'reason': data.get('reason')
+        } for document_id in found])
+
+        changes = Counter()
+        for row in rows:
+            changes[stat_key(row.author_id, row.status, row.type)] -= 1
+            changes[stat_key(row.author_id, data['status'], row.type)] += 1
+        count_documents(changes)
+    db.session.commit()
+
+    for row in rows:
+        publish([row.author_id], 'document_status', {'id': row.id, 'status': data['status']})
+
+    return jsonify({
+        'message': f'Status updated for {len(found)} documents',
+        'results': [{'id': document_id, 'status': 'updated' if document_id in found else 'not_found'}
+                    for document_id in ids]
+    }), 200
+
+
 @documents_bp.route('/<int:document_id>/file', methods=['GET'])
 @jwt_required()
 def get_document_file(document_id):
@@ -247,12 +729,133 @@ def get_document_file(document_id):
     if document.author_id != current_user_id and claims.get('role') != 'admin':
         return jsonify({'error': 'Permission denied'}), 403
 
+    return send_stored_file(document.file_path, document.file_name, document.file_hash)
+
+
+def send_stored_file(file_path, file_name, file_hash):
+    # Blobs are content-addressed and never change, so their hash is a strong validator.
+    # Files stored before the blob store fall back to Werkzeug's mtime/size ETag
+    etag = file_hash or True
+    if file_hash and request.if_none_match.contains(file_hash):
+        response = current_app.response_class(status=304)
+        response.set_etag(file_hash)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    # When the proxy serves the file it also handles Range requests itself
+    offload = current_app.config.get('FILE_OFFLOAD')
+
+    # Blobs have no extension, the original name gives the client a file name and MIME type
     upload_folder = current_app.config['UPLOAD_FOLDER']
-    return send_from_directory(upload_folder, document.file_path)
+    response = send_from_directory(upload_folder, file_path, download_name=file_name,
+                                   etag=etag, conditional=not offload)
+    response.cache_control.private = True
+    if not offload:
+        # Lets PDF viewers see up front that they can fetch pages by byte range
+        response.accept_ranges = 'bytes'
+
+    if offload == 'x-accel-redirect':
+        response.headers.pop('X-Sendfile', None)
+        response.headers['X-Accel-Redirect'] = current_app.config['X_ACCEL_REDIRECT_PREFIX'] + file_path
+
+    return response
+
+
+# --- Версии документа ---
+# Список версий читает только метаданные из document_versions; содержимое файлов
+# открывается лишь при скачивании версии или сравнении двух версий
+
+MAX_DIFF_LINES = 20000  # Longer texts are not diffed line by line
+
+
+def get_readable_document(document_id):
+    # Returns (document, error response)
+    document = Document.query.get_or_404(document_id)
+    if document.author_id != get_jwt_identity() and get_jwt().get('role') != 'admin':
+        return None, (jsonify({'error': 'Permission denied'}), 403)
+    return document, None
+
+
+@documents_bp.route('/<int:document_id>/versions', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_document_versions(document_id):
+    document, error = get_readable_document(document_id)
+    if error:
+        return error
+
+    # Newest version first
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        versions, next_cursor = paginate(DocumentVersion.query.filter_by(document_id=document.id), DocumentVersion,
+                                         'version', 'desc', limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'items': serialize_versions(versions),
+        'next_cursor': next_cursor
+    }), 200
+
+
+@documents_bp.route('/<int:document_id>/versions/<int:version>/file', methods=['GET'])
+@jwt_required()
+def get_version_file(document_id, version):
+    document, error = get_readable_document(document_id)
+    if error:
+        return error
+
+    version = DocumentVersion.query.filter_by(document_id=document.id, version=version).first_or_404()
+    return send_stored_file(version.file_path, version.file_name, version.file_hash)
+
+
+@documents_bp.route('/<int:document_id>/versions/diff', methods=['GET'])
+@jwt_required()
+def diff_versions(document_id):
+    document, error = get_readable_document(document_id)
+    if error:
+        return error
+
+    try:
+        numbers = [int(request.args[name]) for name in ('from', 'to')]
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Version numbers "from" and "to" are required'}), 400
+
+    versions = {version.version: version for version in DocumentVersion.query.filter(
+        DocumentVersion.document_id == document.id, DocumentVersion.version.in_(numbers))}
+    if len(versions) != len(set(numbers)):
+        return jsonify({'error': 'Version not found'}), 404
+
+    # Binary formats are compared by their extracted text
+    texts = []
+    for number in numbers:
+        version = versions[number]
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], version.file_path)
+        try:
+            texts.append(extract_text(path, version.file_name).splitlines())
+        except UnsupportedFormat as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            current_app.logger.warning('Could not read version %s of document %s: %s', number, document.id, e)
+            return jsonify({'error': f'Could not read version {number}'}), 422
+
+    if max(len(lines) for lines in texts) > MAX_DIFF_LINES:
+        return jsonify({'error': f'Versions longer than {MAX_DIFF_LINES} lines cannot be compared'}), 413
+
+    diff = difflib.unified_diff(texts[0], texts[1], fromfile=f'version {numbers[0]}',
+                                tofile=f'version {numbers[1]}', lineterm='')
+    return jsonify({
+        'from': numbers[0],
+        'to': numbers[1],
+        'identical': versions[numbers[0]].file_path == versions[numbers[1]].file_path,
+        'diff': '\n'.join(diff)
+    }), 200
 
 
 @documents_bp.route('/<int:document_id>/history', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_document_history(document_id):
     current_user_id = get_jwt_identity()
     claims = get_jwt()
@@ -263,5 +866,14 @@ def get_document_history(document_id):
     if document.author_id != current_user_id and claims.get('role') != 'admin':
         return jsonify({'error': 'Permission denied'}), 403
 
-    history = document.history.order_by(DocumentHistory.timestamp.desc()).all()
-    return jsonify([h.to_dict() for h in history]), 200
\ No newline at end of file
+    # Newest first; old entries are read from the archive once the hot table runs out
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        items, next_cursor = paginate_history(document, limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'items': items,
+        'next_cursor': next_cursor
+    }), 200
\ No newline at end of file
@@ -0,0 +1 @@
+# Этот файл нужен для того, чтобы папка считалась Python-пакетом
\ No newline at end of file
@@ -0,0 +1,62 @@
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, jwt_required, verify_jwt_in_request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from app.pubsub import get_broker, format_event
+
+# --- Поток событий для клиента (Server-Sent Events) ---
+# Вместо периодического опроса списков клиент держит одно соединение
+# и получает новые сообщения и изменения своих документов
+
+events_bp = Blueprint('events', __name__)
+
+KEEPALIVE_INTERVAL = 15  # Seconds between comments that keep proxies from closing an idle stream
+RETRY_MS = 1000  # How soon the browser reconnects after the stream drops
+
+
+def _ticket_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='event-stream')
+
+
+# EventSource cannot send headers. Instead of putting the JWT into the URL (and so into
+# access logs) the client trades it for a ticket that expires after EVENT_TICKET_TTL seconds
+@events_bp.route('/ticket', methods=['POST'])
+@jwt_required()
+def create_ticket():
+    return jsonify({
+        'ticket': _ticket_serializer().dumps(get_jwt_identity()),
+        'expires_in': current_app.config['EVENT_TICKET_TTL']
+    }), 200
+
+
+@events_bp.route('', methods=['GET'])
+def stream_events():
+    # Either an Authorization header (fetch-based clients) or ?ticket=... (EventSource)
+    ticket = request.args.get('ticket')
+    if ticket:
+        try:
+            user_id = _ticket_serializer().loads(ticket, max_age=current_app.config['EVENT_TICKET_TTL'])
+        except BadSignature:
+            return jsonify({'error': 'Invalid or expired ticket'}), 401
+    else:
+        verify_jwt_in_request(locations=['headers'])
+        user_id = get_jwt_identity()
+
+    subscription = get_broker().subscribe(user_id)
+
+    def generate():
+        try:
+            yield f'retry: {RETRY_MS}\n\n'
+            while True:
+                message = subscription.get(timeout=KEEPALIVE_INTERVAL)
+                if message is None:
+                    yield ': keepalive\n\n'
+                else:
+                    yield format_event(*message)
+        finally:
+            # Runs when the client disconnects and the server closes the generator
+            subscription.close()
+
+    response = current_app.response_class(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx must not buffer the stream
+    return response
@@ -0,0 +1,226 @@
+import os
+import re
+import time
+import zipfile
+from datetime import datetime, timedelta
+from xml.etree import ElementTree
+from flask import current_app
+from sqlalchemy import and_, or_, update
+from app import db
+from app.models import Document, ExtractionJob
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF extraction is optional
+    PdfReader = None
+
+# --- Фоновое извлечение текста из загруженных файлов ---
+# Маршруты только ставят задание в очередь (таблица extraction_jobs) и сразу отвечают,
+# а текст в Document.content записывает отдельный процесс extraction_worker.py
+
+MAX_ATTEMPTS = 3
+STALE_AFTER = timedelta(minutes=15)  # A running job older than this is assumed to be abandoned
+MAX_TEXT_LENGTH = 1000000
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+DRAWING_NS = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+class UnsupportedFormat(Exception):
+    pass
+
+
+def _paragraphs(xml, paragraph_tag, text_tag):
+    root = ElementTree.fromstring(xml)
+    lines = []
+    for paragraph in root.iter(paragraph_tag):
+        line = ''.join(node.text or '' for node in paragraph.iter(text_tag))
+        if line.strip():
+            lines.append(line)
+    return lines
+
+
+def _numbered(names, prefix):
+    # slide2.xml must come before slide10.xml
+    pattern = re.compile(re.escape(prefix) + r'(\d+)\.xml$')
+    found = [(int(m.group(1)), name) for name in names for m in [pattern.match(name)] if m]
+    return [name for _, name in sorted(found)]
+
+
+def extract_docx(path):
+    with zipfile.ZipFile(path) as archive:
+        return '\n'.join(_paragraphs(archive.read('word/document.xml'), WORD_NS + 'p', WORD_NS + 't'))
+
+
+def extract_pptx(path):
+    with zipfile.ZipFile(path) as archive:
+        lines = []
+        for name in _numbered(archive.namelist(), 'ppt/slides/slide'):
+            lines.extend(_paragraphs(archive.read(name), DRAWING_NS + 'p', DRAWING_NS + 't'))
+        return '\n'.join(lines)
+
+
+def extract_xlsx(path):
+    with zipfile.ZipFile(path) as archive:
+        names = archive.namelist()
+        lines = []
+        if 'xl/sharedStrings.xml' in names:
+            lines.extend(_paragraphs(archive.read('xl/sharedStrings.xml'), SHEET_NS + 'si', SHEET_NS + 't'))
+        # Inline strings are stored in the sheets themselves
+        for name in _numbered(names, 'xl/worksheets/sheet'):
+            lines.extend(_paragraphs(archive.read(name), SHEET_NS + 'is', SHEET_NS + 't'))
+        return '\n'.join(lines)
+
+
+def extract_pdf(path):
+    if PdfReader is None:
+        raise UnsupportedFormat('PDF extraction requires the pypdf package')
+    reader = PdfReader(path)
+    return '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+
+def extract_txt(path):
+    with open(path, 'rb') as f:
+        data = f.read(MAX_TEXT_LENGTH * 4)
+    for encoding in ('utf-8', 'cp1251'):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace')
+
+
+EXTRACTORS = {
+    'docx': extract_docx,
+    'pptx': extract_pptx,
+    'xlsx': extract_xlsx,
+    'pdf': extract_pdf,
+    'txt': extract_txt,
+}
+
+
+def extract_text(path, filename=None):
+    # Blobs are stored without an extension, the original file name tells the format
+    filename = filename or path
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    extractor = EXTRACTORS.get(extension)
+    if extractor is None:
+        raise UnsupportedFormat(f'No text extractor for .{extension} files')
+    return extractor(path)[:MAX_TEXT_LENGTH]
+
+
+def enqueue_extraction(document):
+    # Idempotent: a (document, file) pair has a single job. A finished job is queued again
+    # only when the document switches back to a file it used before
+    job = ExtractionJob.query.filter_by(document_id=document.id, file_path=document.file_path).first()
+    if job is None:
+        job = ExtractionJob(document_id=document.id, file_path=document.file_path, status='pending')
+        db.session.add(job)
+    elif job.status not in ('pending', 'running'):
+        job.status = 'pending'
+        job.attempts = 0
+        job.error = None
+    return job
+
+
+def enqueue_missing():
+    # Queues documents whose current file was never queued, e.g. uploaded before the worker existed
+    queued = db.session.query(ExtractionJob.id).filter(
+        ExtractionJob.document_id == Document.id,
+        ExtractionJob.file_path == Document.file_path
+    )
+    documents = Document.query.filter(~queued.exists()).all()
+    for document in documents:
+        enqueue_extraction(document)
+    db.session.commit()
+    return len(documents)
+
+
+def claim_next_job():
+    # Several workers may poll the same table: a job is taken with a compare-and-set UPDATE
+    now = datetime.utcnow()
+    abandoned = and_(ExtractionJob.status == 'running', ExtractionJob.locked_at < now - STALE_AFTER)
+
+    # A file that kills the worker every time (out of memory, crash) must not be retried forever
+    db.session.execute(
+        update(ExtractionJob)
+        .where(abandoned, ExtractionJob.attempts >= MAX_ATTEMPTS)
+        .values(status='failed', locked_at=None, error='The worker stopped while extracting this file')
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    candidates = ExtractionJob.query.filter(or_(
+        ExtractionJob.status == 'pending',
+        and_(abandoned, ExtractionJob.attempts < MAX_ATTEMPTS)
+    )).order_by(ExtractionJob.id).limit(10).all()
+
+    for job in candidates:
+        if job.locked_at is None:
+            lock_condition = ExtractionJob.locked_at.is_(None)
+        else:
+            lock_condition = ExtractionJob.locked_at == job.locked_at
+        result = db.session.execute(
+            update(ExtractionJob)
+            .where(ExtractionJob.id == job.id, ExtractionJob.status == job.status, lock_condition)
+            .values(status='running', locked_at=now, attempts=ExtractionJob.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            db.session.refresh(job)
+            return job
+    return None
+
+
+def _store_content(job, text):
+    # Only writes when the document still points at the extracted file, so a re-upload
+    # that happened meanwhile is never overwritten; updated_at is kept as is
+    db.session.execute(
+        update(Document)
+        .where(Document.id == job.document_id, Document.file_path == job.file_path)
+        .values(content=text, updated_at=Document.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def process_job(job):
+    document = db.session.get(Document, job.document_id)
+    if document is None or document.file_path != job.file_path:
+        job.status = 'skipped'
+        job.error = 'Superseded by a newer upload'
+    else:
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], job.file_path)
+        try:
+            text = extract_text(path, document.file_name)
+        except UnsupportedFormat as e:
+            _store_content(job, None)
+            job.status = 'skipped'
+            job.error = str(e)
+        except Exception as e:
+            current_app.logger.warning('Text extraction failed for job %s: %s', job.id, e)
+            job.status = 'failed' if job.attempts >= MAX_ATTEMPTS else 'pending'
+            job.error = str(e)
+        else:
+            _store_content(job, text)
+            job.status = 'done'
+            job.error = None
+
+    job.locked_at = None
+    db.session.commit()
+    return job
+
+
+def run_worker(poll_interval=2.0, once=False):
+    # once=True drains the queue and returns instead of polling forever
+    processed = 0
+    while True:
+        job = claim_next_job()
+        if job is None:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+            continue
+        process_job(job)
+        processed += 1
@@ -0,0 +1,116 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+from itertools import groupby
+from sqlalchemy import delete
+from app import db
+from app.models import DocumentHistory, DocumentHistoryArchive, load_usernames, serialize_history
+from app.pagination import decode_cursor, encode_cursor, paginate
+
+# --- Архивация истории документов ---
+# Записи старше заданного срока переносятся из document_history в сжатые сегменты
+# document_history_archive. Постраничная выдача истории сначала идёт по горячей таблице,
+# а затем продолжается по архиву с тем же курсором (timestamp, id)
+
+SEGMENT_SIZE = 1000  # History rows moved per transaction
+
+
+def _entry(row):
+    return {
+        'id': row.id,
+        'document_id': row.document_id,
+        'action': row.action,
+        'user_id': row.user_id,
+        'timestamp': row.timestamp.isoformat(),
+        'reason': row.reason
+    }
+
+
+def encode_segment(entries):
+    lines = ''.join(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n' for entry in entries)
+    return gzip.compress(lines.encode('utf-8'))
+
+
+def decode_segment(data):
+    return [json.loads(line) for line in gzip.decompress(data).decode('utf-8').splitlines() if line]
+
+
+def archive_history(older_than_days, segment_size=SEGMENT_SIZE):
+    # Moves entries older than the cutoff; each batch is copied and deleted in one transaction,
+    # so an interrupted run never loses or duplicates entries. Returns the number moved
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    moved = 0
+    while True:
+        rows = DocumentHistory.query.filter(DocumentHistory.timestamp < cutoff).order_by(
+            DocumentHistory.document_id, DocumentHistory.timestamp, DocumentHistory.id
+        ).limit(segment_size).all()
+        if not rows:
+            return moved
+
+        for document_id, group in groupby(rows, key=lambda row: row.document_id):
+            group = list(group)
+            db.session.add(DocumentHistoryArchive(
+                document_id=document_id,
+                min_timestamp=group[0].timestamp,
+                max_timestamp=group[-1].timestamp,
+                entry_count=len(group),
+                data=encode_segment([_entry(row) for row in group])
+            ))
+        db.session.execute(
+            delete(DocumentHistory).where(DocumentHistory.id.in_([row.id for row in rows]))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        db.session.expunge_all()
+        moved += len(rows)
+
+
+def read_archived_history(document_id, before, limit):
+    # Entries older than the (timestamp, id) position before, newest first.
+    # Segments are decompressed newest first, only until the page is full
+    segments = DocumentHistoryArchive.query.filter_by(document_id=document_id)
+    if before is not None:
+        segments = segments.filter(DocumentHistoryArchive.min_timestamp <= before[0])
+    segments = segments.order_by(DocumentHistoryArchive.max_timestamp.desc(), DocumentHistoryArchive.id.desc())
+
+    entries = []
+    for segment in segments.yield_per(10):
+        for entry in decode_segment(segment.data):
+            entry['timestamp'] = datetime.fromisoformat(entry['timestamp'])
+            if before is None or (entry['timestamp'], entry['id']) < before:
+                entries.append(entry)
+        # One extra entry tells whether another page exists
+        if len(entries) > limit:
+            break
+
+    entries.sort(key=lambda entry: (entry['timestamp'], entry['id']), reverse=True)
+    return entries[:limit], len(entries) > limit
+
+
+def paginate_history(document, limit, cursor=None):
+    # Returns (serialized entries, next cursor) across the hot table and the archive
+    rows, next_cursor = paginate(document.history, DocumentHistory, 'timestamp', 'desc', limit, cursor)
+    items = serialize_history(rows)
+    if next_cursor is not None:
+        return items, next_cursor
+
+    # The hot table is exhausted: continue from the last position into the archive
+    if rows:
+        before = (rows[-1].timestamp, rows[-1].id)
+    elif cursor:
+        before = decode_cursor(cursor, 'timestamp', DocumentHistory.timestamp)
+    else:
+        before = None
+
+    archived, has_more = read_archived_history(document.id, before, limit - len(rows))
+    usernames = load_usernames([entry['user_id'] for entry in archived])
+    for entry in archived:
+        items.append(dict(entry, user=usernames.get(entry['user_id']), timestamp=entry['timestamp'].isoformat()))
+
+    if has_more:
+        # A full page of hot rows only probes the archive, the next page starts after the last row
+        if archived:
+            next_cursor = encode_cursor('timestamp', archived[-1]['timestamp'], archived[-1]['id'])
+        else:
+            next_cursor = encode_cursor('timestamp', rows[-1].timestamp, rows[-1].id)
+    return items, next_cursor
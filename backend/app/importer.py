@@ -0,0 +1,152 @@
+import json
+import os
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from zipfile import BadZipFile, ZipFile
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from app import db
+from app.models import Blob, Document, DocumentHistory, DocumentVersion, ExtractionJob
+from app.document_stats import stat_key, count_documents
+from app.storage import acquire_blob, save_stream
+
+# --- Массовый импорт документов ---
+# Файлы записываются в хранилище параллельно, а строки Document/DocumentHistory
+# вставляются пакетами — одна транзакция на пакет. Ошибка в одном файле
+# не прерывает импорт: результат возвращается для каждого элемента
+
+# What reading one file can raise: a broken or truncated member (zlib.error, EOFError),
+# an encrypted one (RuntimeError), an unsupported compression method (NotImplementedError)
+READ_ERRORS = (BadZipFile, KeyError, OSError, ValueError, EOFError, RuntimeError, NotImplementedError, zlib.error)
+
+
+def parse_manifest(raw, names):
+    # Manifest: [{"file": ..., "title": ..., "type": ...}]; without one every file is imported
+    if raw in (None, ''):
+        return [{'file': name, 'title': os.path.splitext(name.rsplit('/', 1)[-1])[0] or name,
+                 'type': 'general'} for name in names]
+
+    manifest = json.loads(raw) if isinstance(raw, str) else raw
+    if not isinstance(manifest, list) or not all(isinstance(entry, dict) for entry in manifest):
+        raise ValueError('Manifest must be a list of objects')
+    return [{'file': _text(entry.get('file')), 'title': _text(entry.get('title')),
+             'type': _text(entry.get('type')) or 'general'} for entry in manifest]
+
+
+def _text(value):
+    return value if isinstance(value, str) else None
+
+
+@contextmanager
+def open_zip_member(archive_path, name):
+    # Every call opens its own handle, so worker threads never share a ZipFile
+    with ZipFile(archive_path) as archive, archive.open(name) as member:
+        yield member
+
+
+def zip_member_names(archive_path):
+    with ZipFile(archive_path) as archive:
+        return [info.filename for info in archive.infolist() if not info.is_dir()]
+
+
+def _store(item, open_source, upload_folder):
+    with open_source(item['file']) as stream:
+        return save_stream(stream, upload_folder)
+
+
+def _insert_batch(batch, user_id):
+    # Blob references: one executemany for known hashes, one multi-row insert for new ones
+    counts = Counter(item['file_hash'] for item in batch)
+    sizes = {item['file_hash']: item['file_size'] for item in batch}
+    existing = {sha256 for (sha256,) in
+                db.session.query(Blob.sha256).filter(Blob.sha256.in_(list(counts)))}
+
+    blobs = Blob.__table__
+    if existing:
+        db.session.execute(
+            update(blobs).where(blobs.c.sha256 == bindparam('b_sha256'))
+            .values(ref_count=blobs.c.ref_count + bindparam('b_count')),
+            [{'b_sha256': sha256, 'b_count': counts[sha256]} for sha256 in existing]
+        )
+    new = [sha256 for sha256 in counts if sha256 not in existing]
+    if new:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(blobs), [
+                    {'sha256': sha256, 'size': sizes[sha256], 'ref_count': counts[sha256]} for sha256 in new
+                ])
+        except IntegrityError:
+            # Another upload stored some of this content first; fall back to one upsert per hash
+            for sha256 in new:
+                acquire_blob(sha256, sizes[sha256], counts[sha256])
+
+    documents = [Document(
+        title=item['title'],
+        type=item['type'],
+        file_path=item['file_path'],
+        file_name=item['file'].rsplit('/', 1)[-1],
+        file_hash=item['file_hash'],
+        author_id=user_id,
+        status='draft'
+    ) for item in batch]
+    db.session.add_all(documents)
+    db.session.flush()  # Get the document IDs
+
+    db.session.add_all([DocumentHistory(document_id=document.id, action='created', user_id=user_id)
+                        for document in documents])
+    db.session.add_all([DocumentVersion(document_id=document.id, version=1, file_path=document.file_path,
+                                        file_name=document.file_name, file_hash=document.file_hash,
+                                        file_size=item['file_size'], author_id=user_id)
+                        for item, document in zip(batch, documents)])
+    db.session.add_all([ExtractionJob(document_id=document.id, file_path=document.file_path, status='pending')
+                        for document in documents])
+    count_documents(Counter(stat_key(user_id, 'draft', item['type']) for item in batch))
+    db.session.commit()
+
+    for item, document in zip(batch, documents):
+        item['document_id'] = document.id
+
+
+def import_documents(items, open_source, upload_folder, user_id, is_allowed, workers=4, batch_size=500):
+    # items: parsed manifest entries; open_source(name) yields a readable binary stream
+    results = [{'index': index, 'file': item['file'], 'status': 'error', 'document_id': None, 'error': None}
+               for index, item in enumerate(items)]
+
+    valid = []
+    for index, item in enumerate(items):
+        if not item['file'] or not item['title']:
+            results[index]['error'] = 'File and title are required'
+        elif len(item['title']) > 200 or len(item['type']) > 50:
+            results[index]['error'] = 'Title or type is too long'
+        elif not is_allowed(item['file']):
+            results[index]['error'] = 'Invalid file type'
+        else:
+            valid.append((index, item))
+
+    # Files are hashed and written in parallel; each one succeeds or fails on its own
+    stored = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(index, item, pool.submit(_store, item, open_source, upload_folder)) for index, item in valid]
+        for index, item, future in futures:
+            try:
+                item['file_hash'], item['file_size'], item['file_path'] = future.result()
+            except READ_ERRORS as e:
+                results[index]['error'] = f'Could not read file: {e}'
+                continue
+            stored.append((index, item))
+
+    for start in range(0, len(stored), batch_size):
+        batch = stored[start:start + batch_size]
+        try:
+            _insert_batch([item for _, item in batch], user_id)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            for index, _ in batch:
+                results[index]['error'] = f'Database error: {e.__class__.__name__}'
+            continue
+        for index, item in batch:
+            results[index].update(status='created', document_id=item['document_id'])
+
+    return results
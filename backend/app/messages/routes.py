@@ -1,16 +1,80 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models import db, Message, User
+from sqlalchemy import false, update
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Message, ThreadSummary, User, serialize_messages
+from app.pagination import paginate, parse_limit
+from app.search import message_subject_match
+from app.pubsub import publish
+from app.user_cache import get_user_cache
+from app.replica import read_replica
 
 messages_bp = Blueprint('messages', __name__)
 
+SORTABLE_FIELDS = {'id', 'subject', 'timestamp', 'read'}
+
 
 # --- Маршруты для работы с сообщениями ---
 # Здесь реализованы функции для получения, создания, просмотра и отметки сообщений как прочитанных
 # Используется Flask Blueprint для организации маршрутов
 
+def change_unread_count(user_id, delta):
+    # Relative UPDATE, so concurrent requests never overwrite each other's changes
+    db.session.execute(
+        update(User).where(User.id == user_id).values(unread_count=User.unread_count + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def mark_read(message):
+    # Compare-and-set: when two requests read the same message, only one decrements the counters
+    result = db.session.execute(
+        update(Message).where(Message.id == message.id, Message.read == false()).values(read=True)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        change_unread_count(message.recipient_id, -1)
+        db.session.execute(
+            update(ThreadSummary)
+            .where(ThreadSummary.thread_id == message.thread_id, ThreadSummary.user_id == message.recipient_id)
+            .values(unread_count=ThreadSummary.unread_count - 1)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+
+def add_to_thread_summaries(message):
+    # Sender and recipient each have a summary row; only the recipient gets an unread message
+    participants = {message.sender_id: 0}
+    participants[message.recipient_id] = 1
+    for user_id, unread in participants.items():
+        for _ in range(2):
+            result = db.session.execute(
+                update(ThreadSummary)
+                .where(ThreadSummary.thread_id == message.thread_id, ThreadSummary.user_id == user_id)
+                .values(last_message_id=message.id, last_message_at=message.timestamp,
+                        message_count=ThreadSummary.message_count + 1,
+                        unread_count=ThreadSummary.unread_count + unread)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                break
+            try:
+                with db.session.begin_nested():
+                    db.session.add(ThreadSummary(thread_id=message.thread_id, user_id=user_id,
+                                                 last_message_id=message.id, last_message_at=message.timestamp,
+                                                 message_count=1, unread_count=unread))
+                break
+            except IntegrityError:
+                # Another request created the summary first; update it instead
+                continue
+        else:
+            raise RuntimeError(f'Could not update thread {message.thread_id} for user {user_id}')
+
+
 @messages_bp.route('', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_messages():
     current_user_id = get_jwt_identity()
 
@@ -23,18 +87,19 @@ def get_messages():
         messages = Message.query.filter_by(sender_id=current_user_id)
 
     # Support searching by subject or sender/recipient
+    # Subjects are matched through the full-text index instead of a table scan
     search = request.args.get('search', '')
     if search:
         if folder == 'inbox':
             # Search in inbox - subject or sender username
             messages = messages.join(User, User.id == Message.sender_id).filter(
-                (Message.subject.ilike(f'%{search}%')) |
+                message_subject_match(search) |
                 (User.username.ilike(f'%{search}%'))
             )
         else:
             # Search in sent - subject or recipient username
             messages = messages.join(User, User.id == Message.recipient_id).filter(
-                (Message.subject.ilike(f'%{search}%')) |
+                message_subject_match(search) |
                 (User.username.ilike(f'%{search}%'))
             )
 
@@ -42,13 +107,21 @@ def get_messages():
     sort_by = request.args.get('sort_by', 'timestamp')
     sort_dir = request.args.get('sort_dir', 'desc')
 
-    if sort_dir == 'desc':
-        messages = messages.order_by(getattr(Message, sort_by).desc())
-    else:
-        messages = messages.order_by(getattr(Message, sort_by))
+    if sort_by not in SORTABLE_FIELDS:
+        return jsonify({'error': f'Invalid sort field. Allowed fields: {", ".join(sorted(SORTABLE_FIELDS))}'}), 400
+
+    # Keyset pagination: page N costs the same as page 1
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        messages, next_cursor = paginate(messages, Message, sort_by, sort_dir, limit,
+                                         request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    messages = messages.all()
-    return jsonify([msg.to_dict() for msg in messages]), 200
+    return jsonify({
+        'items': serialize_messages(messages),
+        'next_cursor': next_cursor
+    }), 200
 
 
 @messages_bp.route('/<int:message_id>', methods=['GET'])
@@ -64,8 +137,7 @@ def get_message(message_id):
 
     # Mark as read if the current user is the recipient
     if message.recipient_id == current_user_id and not message.read:
-        message.read = True
-        db.session.commit()
+        mark_read(message)
 
     return jsonify(message.to_dict()), 200
 
@@ -76,29 +148,64 @@ def create_message():
     current_user_id = get_jwt_identity()
     data = request.get_json()
 
+    if not data:
+        return jsonify({'error': 'Missing required fields'}), 400
+
+    # A reply goes to the other participant of the message it answers and keeps its subject
+    parent = None
+    if data.get('parent_id') is not None:
+        if not isinstance(data['parent_id'], int):
+            return jsonify({'error': 'Invalid parent_id'}), 400
+        parent = db.session.get(Message, data['parent_id'])
+        if parent is None:
+            return jsonify({'error': 'Parent message not found'}), 404
+        if current_user_id not in (parent.sender_id, parent.recipient_id):
+            return jsonify({'error': 'Permission denied'}), 403
+
     # Validate input
-    if not data or not data.get('recipient') or not data.get('subject') or not data.get('body'):
+    if not data.get('body') or (parent is None and (not data.get('recipient') or not data.get('subject'))):
         return jsonify({'error': 'Missing required fields'}), 400
 
     # Find recipient
-    recipient = User.query.filter_by(username=data['recipient']).first()
-    if not recipient:
-        return jsonify({'error': 'Recipient not found'}), 404
+    if parent is not None:
+        recipient_id = parent.sender_id if parent.recipient_id == current_user_id else parent.recipient_id
+        recipient = get_user_cache().get(recipient_id)
+        if not recipient:
+            return jsonify({'error': 'Recipient not found'}), 404
+        if data.get('recipient') and data['recipient'] != recipient['username']:
+            return jsonify({'error': 'A reply can only be sent to the other participant of the thread'}), 400
+    else:
+        recipient = get_user_cache().get_by_username(data['recipient'])
+        if not recipient:
+            return jsonify({'error': 'Recipient not found'}), 404
 
     # Create message
     message = Message(
         sender_id=current_user_id,
-        recipient_id=recipient.id,
-        subject=data['subject'],
-        body=data['body']
+        recipient_id=recipient['id'],
+        subject=data.get('subject') or parent.subject,
+        body=data['body'],
+        parent_id=parent.id if parent is not None else None,
+        thread_id=parent.thread_id if parent is not None else None
     )
 
     db.session.add(message)
+    db.session.flush()  # Get the message ID
+
+    # A new conversation is identified by its first message
+    if message.thread_id is None:
+        message.thread_id = message.id
+
+    change_unread_count(recipient['id'], 1)
+    add_to_thread_summaries(message)
     db.session.commit()
 
+    message_data = message.to_dict()
+    publish([recipient['id']], 'message', message_data)
+
     return jsonify({
         'message': 'Message sent successfully',
-        'message_data': message.to_dict()
+        'message_data': message_data
     }), 201
 
 
@@ -113,10 +220,103 @@ def mark_as_read(message_id):
     if message.recipient_id != current_user_id:
         return jsonify({'error': 'Permission denied'}), 403
 
-    message.read = True
-    db.session.commit()
+    mark_read(message)
 
     return jsonify({
         'message': 'Message marked as read',
         'message_data': message.to_dict()
-    }), 200
\ No newline at end of file
+    }), 200
+
+
+@messages_bp.route('/unread_count', methods=['GET'])
+@jwt_required()
+def get_unread_count():
+    # Inbox badge: a primary key lookup instead of counting messages
+    current_user_id = get_jwt_identity()
+    count = db.session.query(User.unread_count).filter(User.id == current_user_id).scalar()
+    return jsonify({'count': count or 0}), 200
+
+
+@messages_bp.route('/read_all', methods=['PUT'])
+@jwt_required()
+def mark_all_as_read():
+    current_user_id = get_jwt_identity()
+
+    # One UPDATE for the whole inbox; the counter drops by exactly the rows it changed
+    result = db.session.execute(
+        update(Message).where(Message.recipient_id == current_user_id, Message.read == false())
+        .values(read=True).execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        change_unread_count(current_user_id, -result.rowcount)
+        db.session.execute(
+            update(ThreadSummary).where(ThreadSummary.user_id == current_user_id, ThreadSummary.unread_count > 0)
+            .values(unread_count=0).execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+    return jsonify({
+        'message': 'All messages marked as read',
+        'updated': result.rowcount
+    }), 200
+
+
+# --- Переписки ---
+# Список переписок пользователя читается из thread_summaries, сообщения одной
+# переписки отдаются постранично по индексу (thread_id, timestamp, id)
+
+@messages_bp.route('/threads', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_threads():
+    current_user_id = get_jwt_identity()
+
+    # Most recently active threads first
+    threads = ThreadSummary.query.filter_by(user_id=current_user_id)
+    if request.args.get('unread') in ('1', 'true'):
+        threads = threads.filter(ThreadSummary.unread_count > 0)
+
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        threads, next_cursor = paginate(threads, ThreadSummary, 'last_message_at', 'desc', limit,
+                                        request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Last messages of the whole page in one query
+    last_messages = Message.query.filter(Message.id.in_([thread.last_message_id for thread in threads])).all()
+    serialized = {item['id']: item for item in serialize_messages(last_messages)}
+
+    return jsonify({
+        'items': [thread.to_dict(serialized.get(thread.last_message_id)) for thread in threads],
+        'next_cursor': next_cursor
+    }), 200
+
+
+@messages_bp.route('/threads/<int:thread_id>', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_thread(thread_id):
+    current_user_id = get_jwt_identity()
+
+    # Only participants have a summary row for the thread
+    summary = ThreadSummary.query.filter_by(thread_id=thread_id, user_id=current_user_id).first()
+    if summary is None:
+        return jsonify({'error': 'Thread not found'}), 404
+
+    sort_dir = request.args.get('sort_dir', 'asc')
+    if sort_dir not in ('asc', 'desc'):
+        return jsonify({'error': 'Invalid sort direction'}), 400
+
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        messages, next_cursor = paginate(Message.query.filter_by(thread_id=thread_id), Message, 'timestamp',
+                                         sort_dir, limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'thread': summary.to_dict(),
+        'items': serialize_messages(messages),
+        'next_cursor': next_cursor
+    }), 200
@@ -1,6 +1,6 @@
 from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy.sql import func
+from app.passwords import hash_password, verify_password, needs_rehash
+from sqlalchemy import text
 import datetime
 
 
@@ -14,11 +14,15 @@ class User(db.Model):
     email = db.Column(db.String(100), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     role = db.Column(db.String(20), default='user', nullable=False)  # 'admin', 'manager', or 'user'
-    created_at = db.Column(db.DateTime, default=func.now())
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     theme = db.Column(db.String(10), default='light')  # 'light' or 'dark'
+    unread_count = db.Column(db.Integer, default=0, nullable=False)  # Unread inbox messages, kept by the message routes
+    # Incremental backups (app/backup.py) copy the rows changed since the previous snapshot
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
 
     # Relationships
-    documents = db.relationship('Document', backref='author', lazy='dynamic')
+    documents = db.relationship('Document', foreign_keys='Document.author_id',
+                                backref='author', lazy='dynamic')
     messages_sent = db.relationship('Message',
                                     foreign_keys='Message.sender_id',
                                     backref='sender', lazy='dynamic')
@@ -27,10 +31,13 @@ class User(db.Model):
                                         backref='recipient', lazy='dynamic')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
 
     def to_dict(self):
         return {
@@ -52,37 +59,68 @@ class Document(db.Model):
     title = db.Column(db.String(200), nullable=False)
     type = db.Column(db.String(50), nullable=False)  # Document type
     file_path = db.Column(db.String(255), nullable=False)
+    file_name = db.Column(db.String(255), nullable=True)  # Original name of the uploaded file
+    file_hash = db.Column(db.String(64), nullable=True)  # SHA-256 of the stored blob
     status = db.Column(db.String(20), default='draft')  # 'draft', 'pending', 'approved', 'rejected', etc.
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     approver_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     signed = db.Column(db.Boolean, default=False)
     signature_date = db.Column(db.DateTime, nullable=True)
     content = db.Column(db.Text, nullable=True)  # Store document content for preview
-    created_at = db.Column(db.DateTime, default=func.now())
-    updated_at = db.Column(db.DateTime, default=func.now(), onupdate=func.now())
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
+
+    # Indexes follow the listing filters; each ends with the keyset sort order
+    __table_args__ = (
+        db.Index('ix_documents_author_id_created_at', 'author_id', 'created_at', 'id'),
+        db.Index('ix_documents_status_created_at', 'status', 'created_at', 'id'),
+        db.Index('ix_documents_type_created_at', 'type', 'created_at', 'id'),
+        db.Index('ix_documents_created_at', 'created_at', 'id'),
+        # Approval queue: covers only pending rows, so it stays small as the archive grows
+        db.Index('ix_documents_pending_type_created_at', 'type', 'created_at', 'id',
+                 sqlite_where=text("status = 'pending'"), postgresql_where=text("status = 'pending'")),
+    )
 
     # Relationships
     history = db.relationship('DocumentHistory', backref='document', lazy='dynamic')
     approver = db.relationship('User', foreign_keys=[approver_id])
 
-    def to_dict(self):
-        approver_name = self.approver.username if self.approver else None
-        return {
-            'id': self.id,
-            'title': self.title,
-            'type': self.type,
-            'file_path': self.file_path,
-            'status': self.status,
-            'author_id': self.author_id,
-            'author': self.author.username,
-            'approver_id': self.approver_id,
-            'approver': approver_name,
-            'signed': self.signed,
-            'signature_date': self.signature_date.isoformat() if self.signature_date else None,
-            'content': self.content,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+    # Keys of the serialized document; the list view skips the heavy content column
+    FIELDS = ('id', 'title', 'type', 'file_path', 'file_name', 'file_hash', 'status',
+              'author_id', 'author', 'approver_id', 'approver', 'signed', 'signature_date',
+              'content', 'created_at', 'updated_at')
+    SUMMARY_FIELDS = tuple(field for field in FIELDS if field != 'content')
+
+    @classmethod
+    def columns_for(cls, fields):
+        # Columns that must be loaded to serialize the given fields
+        names = {'id'}
+        for field in fields:
+            names.add({'author': 'author_id', 'approver': 'approver_id'}.get(field, field))
+        return [getattr(cls, name) for name in sorted(names)]
+
+    def to_dict(self, usernames=None, fields=None):
+        # usernames: optional id -> username map preloaded for a whole list
+        # fields: optional subset of FIELDS; attributes outside it are never touched,
+        # so columns the query did not load are not lazy-loaded one row at a time
+        data = {}
+        for field in fields or self.FIELDS:
+            if field == 'author':
+                if usernames is not None:
+                    value = usernames.get(self.author_id)
+                else:
+                    value = self.author.username
+            elif field == 'approver':
+                if usernames is not None:
+                    value = usernames.get(self.approver_id)
+                else:
+                    value = self.approver.username if self.approver else None
+            else:
+                value = getattr(self, field)
+                if isinstance(value, datetime.datetime):
+                    value = value.isoformat()
+            data[field] = value
+        return data
 
 
 # --- Модель истории документа ---
@@ -94,24 +132,86 @@ class DocumentHistory(db.Model):
     document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
     action = db.Column(db.String(50), nullable=False)  # 'created', 'updated', 'approved', etc.
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    timestamp = db.Column(db.DateTime, default=func.now())
+    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
     reason = db.Column(db.Text, nullable=True)  # Optional reason for rejection
 
+    __table_args__ = (
+        db.Index('ix_document_history_document_id_timestamp', 'document_id', 'timestamp', 'id'),
+    )
+
     # Relationship
     user = db.relationship('User')
 
-    def to_dict(self):
+    def to_dict(self, usernames=None):
+        user_name = usernames.get(self.user_id) if usernames is not None else self.user.username
         return {
             'id': self.id,
             'document_id': self.document_id,
             'action': self.action,
             'user_id': self.user_id,
-            'user': self.user.username,
+            'user': user_name,
             'timestamp': self.timestamp.isoformat(),
             'reason': self.reason
         }
 
 
+# --- Модель версии документа ---
+# Каждый загруженный файл документа сохраняется как версия. Содержимое лежит в хранилище
+# blobs, поэтому одинаковые версии занимают место один раз, а строка хранит только метаданные
+class DocumentVersion(db.Model):
+    __tablename__ = 'document_versions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
+    version = db.Column(db.Integer, nullable=False)  # 1, 2, ... within the document
+    file_path = db.Column(db.String(255), nullable=False)
+    file_name = db.Column(db.String(255), nullable=True)
+    file_hash = db.Column(db.String(64), nullable=True)  # Empty for files stored before the blob store
+    file_size = db.Column(db.BigInteger, nullable=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Who uploaded this version
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('document_id', 'version', name='uq_document_versions_document_version'),
+    )
+
+    # Relationship
+    author = db.relationship('User')
+
+    def to_dict(self, usernames=None):
+        author_name = usernames.get(self.author_id) if usernames is not None else self.author.username
+        return {
+            'id': self.id,
+            'document_id': self.document_id,
+            'version': self.version,
+            'file_name': self.file_name,
+            'file_hash': self.file_hash,
+            'file_size': self.file_size,
+            'author_id': self.author_id,
+            'author': author_name,
+            'created_at': self.created_at.isoformat()
+        }
+
+
+# --- Архив истории документа ---
+# Старые записи истории переносятся сюда сегментами: JSONL, сжатый gzip, по одному
+# сегменту на документ и пакет архивации. Горячая таблица document_history остаётся маленькой
+class DocumentHistoryArchive(db.Model):
+    __tablename__ = 'document_history_archive'
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
+    min_timestamp = db.Column(db.DateTime, nullable=False)  # Oldest entry in the segment
+    max_timestamp = db.Column(db.DateTime, nullable=False)  # Newest entry in the segment
+    entry_count = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.Index('ix_document_history_archive_document_id_max_timestamp', 'document_id', 'max_timestamp'),
+    )
+
+
 # --- Модель сообщения ---
 # Описывает личные сообщения между пользователями
 class Message(db.Model):
@@ -122,18 +222,207 @@ class Message(db.Model):
     recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     subject = db.Column(db.String(100), nullable=False)
     body = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=func.now())
+    timestamp = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     read = db.Column(db.Boolean, default=False)
+    thread_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=True)  # Id of the first message of the conversation
+    parent_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=True)  # Message this one replies to
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
 
-    def to_dict(self):
+    # Inbox and sent folders are listed newest first, a thread in the order it was written
+    __table_args__ = (
+        db.Index('ix_messages_recipient_id_timestamp', 'recipient_id', 'timestamp', 'id'),
+        db.Index('ix_messages_sender_id_timestamp', 'sender_id', 'timestamp', 'id'),
+        db.Index('ix_messages_thread_id_timestamp', 'thread_id', 'timestamp', 'id'),
+    )
+
+    def to_dict(self, usernames=None):
+        if usernames is not None:
+            sender_name = usernames.get(self.sender_id)
+            recipient_name = usernames.get(self.recipient_id)
+        else:
+            sender_name = self.sender.username
+            recipient_name = self.recipient.username
         return {
             'id': self.id,
             'sender_id': self.sender_id,
-            'sender': self.sender.username,
+            'sender': sender_name,
             'recipient_id': self.recipient_id,
-            'recipient': self.recipient.username,
+            'recipient': recipient_name,
             'subject': self.subject,
             'body': self.body,
             'timestamp': self.timestamp.isoformat(),
-            'read': self.read
-        }
\ No newline at end of file
+            'read': self.read,
+            'thread_id': self.thread_id,
+            'parent_id': self.parent_id
+        }
+
+
+# --- Модель сводки по переписке ---
+# Одна строка на участника переписки: последнее сообщение, число сообщений и непрочитанных.
+# Список переписок читается из этой таблицы, а не группировкой всех сообщений
+class ThreadSummary(db.Model):
+    __tablename__ = 'thread_summaries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    thread_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), nullable=False)
+    last_message_at = db.Column(db.DateTime, nullable=False)
+    message_count = db.Column(db.Integer, default=0, nullable=False)
+    unread_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('thread_id', 'user_id', name='uq_thread_summaries_thread_user'),
+        db.Index('ix_thread_summaries_user_id_last_message_at', 'user_id', 'last_message_at', 'id'),
+    )
+
+    def to_dict(self, last_message=None):
+        # last_message: serialized Message preloaded for a whole page
+        return {
+            'thread_id': self.thread_id,
+            'message_count': self.message_count,
+            'unread_count': self.unread_count,
+            'unread': self.unread_count > 0,
+            'last_message_at': self.last_message_at.isoformat(),
+            'last_message': last_message
+        }
+
+
+# --- Модель файла в хранилище ---
+# Содержимое загрузки, адресуемое по SHA-256; ref_count — число документов, ссылающихся на файл
+class Blob(db.Model):
+    __tablename__ = 'blobs'
+
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
+
+
+# --- Модель сессии загрузки по частям ---
+# Большой файл передаётся частями в .incoming/<id>.part; received — сколько байт уже записано,
+# поэтому прерванную загрузку можно продолжить с этого места
+class UploadSession(db.Model):
+    __tablename__ = 'upload_sessions'
+
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    file_name = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)  # Declared total size in bytes
+    received = db.Column(db.BigInteger, default=0, nullable=False)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=True)  # Set on completion
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
+
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'title': self.title,
+            'type': self.type,
+            'file_name': self.file_name,
+            'size': self.size,
+            'received': self.received,
+            'document_id': self.document_id,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+
+
+# --- Модель задания на извлечение текста ---
+# Очередь фоновой обработки: одна строка на пару (документ, файл), поэтому
+# повторная постановка того же файла в очередь ничего не меняет
+class ExtractionJob(db.Model):
+    __tablename__ = 'extraction_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
+    file_path = db.Column(db.String(255), nullable=False)  # File version the job extracts
+    status = db.Column(db.String(20), default='pending', nullable=False)  # 'pending', 'running', 'done', 'failed', 'skipped'
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.Text, nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)  # Set while a worker holds the job
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('document_id', 'file_path', name='uq_extraction_jobs_document_file'),
+        db.Index('ix_extraction_jobs_status_id', 'status', 'id'),
+    )
+
+
+# --- Модель сводной статистики документов ---
+# Число документов для каждой комбинации (автор, статус, тип). Строки изменяются
+# маршрутами вместе с самими документами, поэтому /api/stats не сканирует documents
+class DocumentStat(db.Model):
+    __tablename__ = 'document_stats'
+
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)  # '' for documents without a status
+    type = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
+
+
+# --- Модель времени последней записи пользователя ---
+# Пока запись свежее REPLICA_STICKY_SECONDS, запросы пользователя читают из основной базы,
+# а не с реплики. Строка хранится в базе, поэтому её видят все процессы сервера
+class UserWrite(db.Model):
+    __tablename__ = 'user_writes'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    written_at = db.Column(db.DateTime, nullable=False)
+
+
+# --- Модель удалённой строки ---
+# Ключи строк, удалённых из отслеживаемых таблиц. Строки добавляет триггер базы данных
+# (app/change_tracking.py), инкрементальная резервная копия переносит по ним удаления
+class DeletedRow(db.Model):
+    __tablename__ = 'deleted_rows'
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(64), nullable=False)
+    row_key = db.Column(db.Text, nullable=False)  # JSON array of the primary key values
+    deleted_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+# --- Пакетная сериализация списков ---
+# Имена всех связанных пользователей загружаются одним запросом,
+# чтобы to_dict не выполнял отдельный SELECT для каждой строки
+def load_usernames(user_ids):
+    from app.user_cache import get_user_cache  # The cache module imports the models
+    ids = {user_id for user_id in user_ids if user_id is not None}
+    if not ids:
+        return {}
+    return {user_id: record['username'] for user_id, record in get_user_cache().get_many(ids).items()}
+
+
+def serialize_documents(documents, fields=None):
+    fields = fields or Document.FIELDS
+    user_ids = []
+    if 'author' in fields:
+        user_ids += [doc.author_id for doc in documents]
+    if 'approver' in fields:
+        user_ids += [doc.approver_id for doc in documents]
+    usernames = load_usernames(user_ids)
+    return [doc.to_dict(usernames, fields) for doc in documents]
+
+
+def serialize_history(entries):
+    usernames = load_usernames([entry.user_id for entry in entries])
+    return [entry.to_dict(usernames) for entry in entries]
+
+
+def serialize_versions(versions):
+    usernames = load_usernames([version.author_id for version in versions])
+    return [version.to_dict(usernames) for version in versions]
+
+
+def serialize_messages(messages):
+    usernames = load_usernames(
+        [msg.sender_id for msg in messages] + [msg.recipient_id for msg in messages]
+    )
+    return [msg.to_dict(usernames) for msg in messages]
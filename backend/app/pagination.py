@@ -0,0 +1,94 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+# --- Курсорная (keyset) пагинация списков ---
+# Курсор хранит значение поля сортировки и id последней строки страницы,
+# поэтому следующая страница выбирается по индексу, а не через OFFSET
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Dialects that sort NULL after every value in ascending order; SQLite and MySQL sort it first
+NULLS_LARGEST_DIALECTS = {'postgresql', 'oracle'}
+
+
+def parse_limit(value):
+    # Missing limit falls back to the default page size, oversized ones are clamped
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid limit')
+    if limit < 1:
+        raise ValueError('Invalid limit')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def encode_cursor(sort_by, value, row_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort_by, value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_by, column):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_sort_by, value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+    # A cursor is only valid for the ordering it was issued for
+    if cursor_sort_by != sort_by or not isinstance(row_id, int):
+        raise ValueError('Invalid cursor')
+
+    if value is not None and column.type.python_type is datetime:
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid cursor')
+    return value, row_id
+
+
+def keyset_filter(column, id_column, descending, value, row_id, nulls_largest):
+    # Rows after (value, row_id) in the page order. NULL never compares equal, so rows with
+    # a NULL sort value are placed explicitly, where the database's own ordering puts them
+    id_after = id_column < row_id if descending else id_column > row_id
+    nulls_at_end = nulls_largest != descending
+    if value is None:
+        return and_(column.is_(None), id_after) if nulls_at_end else or_(column.is_not(None), id_after)
+
+    after = or_(column < value if descending else column > value, and_(column == value, id_after))
+    if nulls_at_end and column.expression.nullable:
+        after = or_(after, column.is_(None))
+    return after
+
+
+def paginate(query, model, sort_by, sort_dir, limit, cursor=None):
+    # Orders by (sort column, id) so the position of every row is unambiguous
+    column = getattr(model, sort_by)
+    descending = sort_dir == 'desc'
+
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort_by, column)
+        # No NULLS FIRST/LAST in ORDER BY, it would keep the database from reading the order off an index
+        nulls_largest = query.session.get_bind().dialect.name in NULLS_LARGEST_DIALECTS
+        query = query.filter(keyset_filter(column, model.id, descending, value, row_id, nulls_largest))
+
+    if descending:
+        query = query.order_by(column.desc(), model.id.desc())
+    else:
+        query = query.order_by(column.asc(), model.id.asc())
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_by, getattr(last, sort_by), last.id)
+
+    return rows, next_cursor
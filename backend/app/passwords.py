@@ -0,0 +1,98 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+# --- Хеширование паролей в пуле процессов ---
+# PBKDF2 нагружает процессор на сотни миллисекунд, поэтому хеши считаются в ограниченном
+# пуле процессов, а не в обработчике запроса. Алгоритм и стоимость задаются настройкой
+# PASSWORD_HASH_METHOD; хеш со старыми параметрами пересчитывается при следующем входе
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = None
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def _normalize(method):
+    # 'pbkdf2:sha256' is stored with Werkzeug's default iteration count
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2' and len(parts) == 2:
+        return f'{method}:{DEFAULT_PBKDF2_ITERATIONS}'
+    return method
+
+
+def hash_method():
+    return _normalize(current_app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'))
+
+
+def _get_executor():
+    # Created on first use, so every server worker process gets its own pool after forking.
+    # Workers are spawned rather than forked: they never inherit DB connections or held locks,
+    # but they import the main module, so scripts must keep their work under __main__ (see wsgi.py)
+    global _executor, _pending
+    with _executor_lock:
+        if _executor is None:
+            workers = current_app.config.get('PASSWORD_HASH_WORKERS', 2)
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pending = threading.BoundedSemaphore(workers * current_app.config.get('PASSWORD_HASH_QUEUE', 4))
+        return _executor, _pending
+
+
+def _run(function, *args):
+    # PASSWORD_HASH_WORKERS = 0 hashes in the request thread (development, scripts)
+    if not current_app.config.get('PASSWORD_HASH_WORKERS', 2):
+        return function(*args)
+
+    executor, pending = _get_executor()
+    timeout = current_app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+    # Bounded queue: during a login storm excess requests fail fast instead of piling up
+    if not pending.acquire(timeout=timeout):
+        raise PasswordHasherBusy('Too many password checks in progress')
+    try:
+        future = executor.submit(function, *args)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            future.cancel()  # Still queued: it will not take a worker. Running: its result is dropped
+            raise PasswordHasherBusy('Password check timed out')
+    except BrokenProcessPool:
+        # A worker died (killed, out of memory); the next request starts a fresh pool
+        _discard_executor(executor)
+        raise PasswordHasherBusy('Password hashing pool is restarting')
+    finally:
+        pending.release()
+
+
+def _discard_executor(executor):
+    global _executor, _pending
+    with _executor_lock:
+        if _executor is executor:
+            _executor = _pending = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, hash_method())
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    # The method and cost are stored in front of the salt: 'pbkdf2:sha256:260000$salt$hash'
+    return _normalize(password_hash.split('$', 1)[0]) != hash_method()
+
+
+def shutdown_executor():
+    global _executor, _pending
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = _pending = None
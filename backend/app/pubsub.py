@@ -0,0 +1,159 @@
+import json
+import logging
+import queue
+import select
+import threading
+import time
+from flask import current_app
+from sqlalchemy import text
+
+# --- Публикация событий для подписанных клиентов ---
+# Маршруты публикуют событие после commit, а открытые SSE-соединения пользователя
+# получают его сразу. Брокер выбирается настройкой EVENT_BROKER: 'local' работает только
+# внутри одного процесса (сервер разработки), 'postgres' передаёт события между всеми
+# процессами gunicorn через LISTEN/NOTIFY
+
+SUBSCRIBER_QUEUE_SIZE = 100  # Events buffered for a client that reads too slowly
+EVENT_CHANNEL = 'dms_events'
+NOTIFY_PAYLOAD_LIMIT = 7900  # PostgreSQL rejects NOTIFY payloads of 8000 bytes and more
+LISTEN_POLL_INTERVAL = 5  # Seconds between checks that the listening connection is alive
+RECONNECT_DELAY = 2
+
+
+class Subscription:
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def get(self, timeout):
+        # Returns (event, data) or None when nothing arrived within the timeout
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    # Fan-out inside one process: every subscriber has its own bounded queue
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._logger = app.logger if app is not None else logging.getLogger(__name__)
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def deliver(self, user_id, event, data):
+        # Hands an event to the subscribers connected to this process
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait((event, data))
+            except queue.Full:
+                # A stalled client loses events rather than blocking the request that publishes
+                self._logger.warning('Dropping %s event for user %s: queue is full', event, user_id)
+
+    def publish(self, user_id, event, data):
+        self.deliver(user_id, event, data)
+
+
+class PostgresBroker(LocalBroker):
+    # publish() sends NOTIFY, so the event reaches every server process. Each process keeps
+    # one LISTEN connection in a background thread and delivers to its own subscribers
+    def __init__(self, app=None):
+        super().__init__(app)
+        self._listener = None
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._listener is None:
+                # The engine is taken from the request that opens the first stream
+                from app import db
+                self._listener = threading.Thread(target=self._listen, args=(db.engine,), daemon=True,
+                                                  name='event-listener')
+                self._listener.start()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id, event, data):
+        from app import db
+        payload = json.dumps({'user_id': user_id, 'event': event, 'data': data}, separators=(',', ':'))
+        if len(payload.encode('utf-8')) > NOTIFY_PAYLOAD_LIMIT:
+            self._logger.warning('Dropping %s event for user %s: payload is too large', event, user_id)
+            return
+        with db.engine.begin() as connection:
+            connection.execute(text('SELECT pg_notify(:channel, :payload)'),
+                               {'channel': EVENT_CHANNEL, 'payload': payload})
+
+    def _listen(self, engine):
+        while True:
+            connection = None
+            try:
+                # A connection of its own, outside the pool: it stays in LISTEN for the process lifetime
+                connection = engine.raw_connection()
+                connection.detach()
+                raw = connection.driver_connection
+                raw.autocommit = True
+                with raw.cursor() as cursor:
+                    cursor.execute(f'LISTEN {EVENT_CHANNEL}')
+                while True:
+                    if select.select([raw], [], [], LISTEN_POLL_INTERVAL)[0]:
+                        raw.poll()
+                        while raw.notifies:
+                            message = json.loads(raw.notifies.pop(0).payload)
+                            self.deliver(message['user_id'], message['event'], message['data'])
+                    else:
+                        raw.poll()  # Raises if the server went away
+            except Exception:
+                # Events published while reconnecting are lost, like those of a client that was offline
+                self._logger.exception('Event listener connection failed, reconnecting')
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                time.sleep(RECONNECT_DELAY)
+
+
+BROKERS = {
+    'local': LocalBroker,
+    'postgres': PostgresBroker,
+}
+
+
+def init_broker(app):
+    # Without an explicit setting PostgreSQL deployments get the cross-process broker
+    name = app.config.get('EVENT_BROKER')
+    if not name:
+        name = 'postgres' if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql') else 'local'
+    app.extensions['event_broker'] = BROKERS[name](app)
+
+
+def get_broker():
+    return current_app.extensions['event_broker']
+
+
+def publish(user_ids, event, data):
+    # Call after commit, so clients never hear about changes that were rolled back
+    broker = get_broker()
+    for user_id in set(user_ids):
+        broker.publish(user_id, event, data)
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
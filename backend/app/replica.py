@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, g, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+# --- Чтение с реплики базы данных ---
+# GET-маршруты, отмеченные @read_replica, читают с привязки 'replica' (REPLICA_DATABASE_URI),
+# а все записи идут в основную базу. После собственной записи пользователь REPLICA_STICKY_SECONDS
+# секунд читает из основной базы (время записи в user_writes), чтобы не увидеть отставшую реплику
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # Flushes and INSERT/UPDATE/DELETE statements always go to the primary
+        if (bind is None and not self._flushing and not getattr(clause, 'is_dml', False)
+                and has_request_context() and g.get('use_replica', False)):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_configured():
+    return REPLICA_BIND in (current_app.config.get('SQLALCHEMY_BINDS') or {})
+
+
+def current_user_id():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        # The route does not require a token
+        return None
+
+
+def wrote_recently(user_id):
+    # A primary key lookup on the primary; the connection goes back to the pool right away.
+    # Imported here because app/__init__.py imports this module before db exists
+    from app import db
+    from app.models import UserWrite
+    with db.engine.connect() as connection:
+        written_at = connection.execute(
+            select(UserWrite.written_at).where(UserWrite.user_id == user_id)
+        ).scalar()
+    sticky = timedelta(seconds=current_app.config.get('REPLICA_STICKY_SECONDS', 5))
+    return written_at is not None and datetime.utcnow() - written_at < sticky
+
+
+def remember_write(user_id):
+    # Its own short transaction, committed before the response reaches the client
+    from app import db
+    from app.models import UserWrite
+    written_at = datetime.utcnow()
+    for _ in range(2):
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                update(UserWrite).where(UserWrite.user_id == user_id).values(written_at=written_at)
+            )
+        if result.rowcount:
+            return
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(UserWrite).values(user_id=user_id, written_at=written_at))
+            return
+        except IntegrityError:
+            # A parallel request of the same user inserted the row first; update it instead
+            continue
+    raise RuntimeError(f'Could not record a write of user {user_id}')
+
+
+def read_replica(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if replica_configured() and not wrote_recently(get_jwt_identity()):
+            g.use_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# A transaction that wrote anything marks the request, which then records the time of the write
+def _orm_write(state):
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info['wrote'] = True
+
+
+def _flushed(session, flush_context):
+    session.info['wrote'] = True
+
+
+def _committed(session):
+    if session.info.pop('wrote', False) and has_request_context():
+        g.db_wrote = True
+
+
+def _rolled_back(session):
+    session.info.pop('wrote', None)
+
+
+event.listen(RoutingSession, 'do_orm_execute', _orm_write)
+event.listen(RoutingSession, 'after_flush', _flushed)
+event.listen(RoutingSession, 'after_commit', _committed)
+event.listen(RoutingSession, 'after_rollback', _rolled_back)
+
+
+def init_replica(app):
+    @app.after_request
+    def record_write(response):
+        if g.get('db_wrote') and replica_configured():
+            user_id = current_user_id()
+            if user_id is not None:
+                remember_write(user_id)
+        return response
@@ -0,0 +1,162 @@
+import re
+from sqlalchemy import DDL, Integer, and_, column, event, false, func, literal, or_, text
+from app import db
+from app.models import Document, Message
+
+# --- Полнотекстовый поиск ---
+# На SQLite используется FTS5 (external content таблицы, синхронизируемые триггерами),
+# на PostgreSQL — tsvector с GIN-индексом. Индекс обновляется самой БД при INSERT/UPDATE,
+# поэтому маршрутам не нужно ничего делать при создании или изменении документа
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Virtual tables, their shadow tables and generated columns are not part of the models
+SEARCH_TABLE_PREFIXES = ('documents_fts', 'messages_fts')
+SEARCH_COLUMNS = ('search_vector',)
+
+SQLITE_DOCUMENTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+        title, content, content='documents', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_ai AFTER INSERT ON documents BEGIN
+        INSERT INTO documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_ad AFTER DELETE ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    # Only changes to the indexed text touch the index; status updates do not
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_au AFTER UPDATE OF title, content ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+]
+
+SQLITE_MESSAGES_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        subject, content='messages', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, subject) VALUES (new.id, new.subject);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, subject) VALUES ('delete', old.id, old.subject);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF subject ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, subject) VALUES ('delete', old.id, old.subject);
+        INSERT INTO messages_fts(rowid, subject) VALUES (new.id, new.subject);
+    END""",
+]
+
+# The 'simple' configuration does no stemming, which suits mixed Russian/English text
+POSTGRES_DOCUMENTS_DDL = [
+    """ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(content, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_documents_search_vector ON documents USING gin (search_vector)",
+]
+
+POSTGRES_MESSAGES_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_messages_subject_search ON messages USING gin (to_tsvector('simple', subject))",
+]
+
+# Tables created through db.create_all() get the search index as well
+for statement in SQLITE_DOCUMENTS_DDL:
+    event.listen(Document.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in SQLITE_MESSAGES_DDL:
+    event.listen(Message.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRES_DOCUMENTS_DDL:
+    event.listen(Document.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+for statement in POSTGRES_MESSAGES_DDL:
+    event.listen(Message.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Keeps Alembic autogenerate from dropping the search structures
+    if type_ == 'table' and reflected and name.startswith(SEARCH_TABLE_PREFIXES):
+        return False
+    if type_ == 'column' and reflected and name in SEARCH_COLUMNS:
+        return False
+    return True
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def tokenize(query_text):
+    return TOKEN_RE.findall(query_text or '')
+
+
+def _fts5_query(tokens):
+    # Quoted prefix terms: user input can never be parsed as FTS5 syntax
+    return ' AND '.join(f'"{token}"*' for token in tokens)
+
+
+def _tsquery(tokens):
+    return ' & '.join(f'{token}:*' for token in tokens)
+
+
+def search_documents(query_text, limit, author_id=None):
+    # Returns [(document_id, rank)] best match first; author_id limits results to one author
+    tokens = tokenize(query_text)
+    if not tokens:
+        return []
+
+    params = {'limit': limit}
+    author_filter = ''
+    if author_id is not None:
+        author_filter = 'AND documents.author_id = :author_id'
+        params['author_id'] = author_id
+
+    dialect = _dialect()
+    if dialect == 'sqlite':
+        params['query'] = _fts5_query(tokens)
+        # bm25 is lower for better matches; title hits weigh more than content hits
+        rows = db.session.execute(text(f"""
+            SELECT documents.id, -bm25(documents_fts, 10.0, 1.0) AS rank
+            FROM documents_fts JOIN documents ON documents.id = documents_fts.rowid
+            WHERE documents_fts MATCH :query {author_filter}
+            ORDER BY bm25(documents_fts, 10.0, 1.0)
+            LIMIT :limit
+        """), params)
+    elif dialect == 'postgresql':
+        params['query'] = _tsquery(tokens)
+        rows = db.session.execute(text(f"""
+            SELECT documents.id, ts_rank(search_vector, to_tsquery('simple', :query)) AS rank
+            FROM documents
+            WHERE search_vector @@ to_tsquery('simple', :query) {author_filter}
+            ORDER BY rank DESC, documents.id DESC
+            LIMIT :limit
+        """), params)
+    else:
+        # No inverted index available: unranked substring match
+        query = db.session.query(Document.id, literal(0.0))
+        for token in tokens:
+            query = query.filter(or_(Document.title.ilike(f'%{token}%'), Document.content.ilike(f'%{token}%')))
+        if author_id is not None:
+            query = query.filter(Document.author_id == author_id)
+        rows = query.order_by(Document.id.desc()).limit(limit)
+
+    return [(row[0], float(row[1])) for row in rows]
+
+
+def message_subject_match(query_text):
+    # SQL condition matching messages whose subject contains every search term
+    tokens = tokenize(query_text)
+    if not tokens:
+        return false()
+
+    dialect = _dialect()
+    if dialect == 'sqlite':
+        matches = text('SELECT rowid FROM messages_fts WHERE messages_fts MATCH :subject_query')
+        matches = matches.bindparams(subject_query=_fts5_query(tokens)).columns(column('rowid', Integer))
+        return Message.id.in_(matches)
+    if dialect == 'postgresql':
+        return func.to_tsvector('simple', Message.subject).op('@@')(
+            func.to_tsquery('simple', _tsquery(tokens))
+        )
+    return and_(*[Message.subject.ilike(f'%{token}%') for token in tokens])
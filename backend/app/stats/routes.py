@@ -0,0 +1,61 @@
+from collections import Counter
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from app.models import Document, DocumentHistory, DocumentStat, load_usernames, serialize_history
+from app.user_cache import get_user_cache
+from app.replica import read_replica
+
+# --- Статистика для панели управления ---
+# Счётчики читаются из сводной таблицы document_stats, размер которой зависит
+# от числа комбинаций (автор, статус, тип), а не от числа документов
+
+stats_bp = Blueprint('stats', __name__)
+
+RECENT_ACTIVITY_LIMIT = 10
+
+
+@stats_bp.route('', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_stats():
+    current_user_id = get_jwt_identity()
+    claims = get_jwt()
+
+    stats = DocumentStat.query.filter(DocumentStat.count > 0)
+    history = DocumentHistory.query
+
+    # Non-admin users only see statistics of their own documents
+    if claims.get('role') != 'admin':
+        stats = stats.filter(DocumentStat.author_id == current_user_id)
+        history = history.join(Document, Document.id == DocumentHistory.document_id) \
+            .filter(Document.author_id == current_user_id)
+
+    by_status, by_type, by_author = Counter(), Counter(), Counter()
+    for row in stats:
+        by_status[row.status] += row.count
+        by_type[row.type] += row.count
+        by_author[row.author_id] += row.count
+
+    usernames = load_usernames(by_author)
+
+    # Newest entries by primary key, so no scan over the timestamp column is needed
+    recent = history.order_by(DocumentHistory.id.desc()).limit(RECENT_ACTIVITY_LIMIT).all()
+
+    return jsonify({
+        'total': sum(by_status.values()),
+        'by_status': dict(by_status),
+        'by_type': dict(by_type),
+        'by_author': [{'author_id': author_id, 'author': usernames.get(author_id), 'count': count}
+                      for author_id, count in by_author.most_common()],
+        'recent_activity': serialize_history(recent)
+    }), 200
+
+
+@stats_bp.route('/user_cache', methods=['GET'])
+@jwt_required()
+def get_user_cache_stats():
+    # Hit and miss counters of this server process since it started
+    if get_jwt().get('role') != 'admin':
+        return jsonify({'error': 'Permission denied'}), 403
+
+    return jsonify(get_user_cache().stats()), 200
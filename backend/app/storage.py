@@ -0,0 +1,123 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Blob
+
+# --- Контентно-адресуемое хранилище загруженных файлов ---
+# Файл хранится один раз под именем своего SHA-256 в подкаталогах ab/cd/abcd...,
+# а таблица blobs считает, сколько документов ссылается на каждый файл
+
+CHUNK_SIZE = 64 * 1024
+INCOMING_DIR = '.incoming'  # Partially written uploads, on the same filesystem as the blobs
+
+
+def blob_path(sha256):
+    # Relative to UPLOAD_FOLDER; two levels of fan-out keep directories small
+    return f'{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+
+def _incoming_file(upload_folder):
+    incoming_folder = os.path.join(upload_folder, INCOMING_DIR)
+    os.makedirs(incoming_folder, exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=incoming_folder, delete=False)
+
+
+def store_file(tmp_path, sha256, upload_folder=None):
+    # Moves a fully written temp file into place unless the same content is already stored
+    upload_folder = upload_folder or current_app.config['UPLOAD_FOLDER']
+    final_path = os.path.join(upload_folder, blob_path(sha256))
+    if os.path.exists(final_path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(tmp_path, final_path)
+    return blob_path(sha256)
+
+
+def save_stream(stream, upload_folder):
+    # Hashes the data while streaming it to disk, so it is read only once.
+    # Takes the folder explicitly so it can run in worker threads without an app context
+    digest = hashlib.sha256()
+    size = 0
+    with _incoming_file(upload_folder) as tmp:
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        except BaseException:
+            # A source that fails half way must not leave its partial copy behind
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+
+    sha256 = digest.hexdigest()
+    return sha256, size, store_file(tmp.name, sha256, upload_folder)
+
+
+def spool_stream(stream, upload_folder):
+    # Copies a stream to a temp file under .incoming and returns its path
+    with _incoming_file(upload_folder) as tmp:
+        shutil.copyfileobj(stream, tmp, CHUNK_SIZE)
+    return tmp.name
+
+
+def save_upload(file_storage):
+    return save_stream(file_storage.stream, current_app.config['UPLOAD_FOLDER'])
+
+
+def partial_upload_path(upload_id):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], INCOMING_DIR, f'{upload_id}.part')
+
+
+def write_chunk(path, stream, offset, max_length):
+    # Copies a request body to the given offset with bounded memory; returns bytes written
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = 0
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+        f.seek(offset)
+        while True:
+            chunk = stream.read(min(CHUNK_SIZE, max_length - written + 1))
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_length:
+                raise ValueError('Chunk exceeds the declared upload size')
+            f.write(chunk)
+    return written
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def acquire_blob(sha256, size, count=1):
+    # Adds count references in the current transaction, creating the row for new content
+    for _ in range(2):
+        result = db.session.execute(
+            update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + count)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.add(Blob(sha256=sha256, size=size, ref_count=count))
+            return
+        except IntegrityError:
+            # Another request inserted the same content first; count our reference on its row
+            continue
+    raise RuntimeError(f'Could not reference blob {sha256}')
+
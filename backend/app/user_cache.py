@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app import db
+from app.models import User
+
+# --- Кэш записей пользователей в памяти процесса ---
+# id, имя, роль и остальные поля User.to_dict() для частых запросов (профиль, имена авторов
+# и отправителей, поиск получателя по имени). Размер ограничен (LRU), записи устаревают
+# через ttl секунд и удаляются при изменении пользователя через ORM в этом процессе.
+# Собственный профиль сверяется с users.updated_at, чтобы изменения из других процессов
+# были видны сразу. Записи всегда читаются из основной базы, не с реплики
+
+
+class UserCache:
+    def __init__(self, max_size=10000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._records = OrderedDict()  # id -> (expires at, record, updated_at), least recently used first
+        self._ids_by_username = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, user_id):
+        # Caller holds the lock
+        entry = self._records.get(user_id)
+        if entry is None:
+            return None
+        expires_at, record, _ = entry
+        if expires_at < time.monotonic():
+            self._discard(user_id)
+            return None
+        self._records.move_to_end(user_id)
+        return record
+
+    def _discard(self, user_id):
+        entry = self._records.pop(user_id, None)
+        if entry is not None and self._ids_by_username.get(entry[1]['username']) == user_id:
+            del self._ids_by_username[entry[1]['username']]
+
+    def _load(self, condition):
+        # From the primary even in @read_replica routes: a lagging row would stay cached for ttl
+        users = db.session.execute(select(User).where(condition), bind_arguments={'bind': db.engine}).scalars()
+        records = []
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for user in users:
+                record = user.to_dict()
+                self._discard(record['id'])
+                self._records[record['id']] = (expires_at, record, user.updated_at)
+                self._ids_by_username[record['username']] = record['id']
+                records.append(record)
+            while len(self._records) > self.max_size:
+                self._discard(next(iter(self._records)))
+                self.evictions += 1
+        return records
+
+    def get_many(self, user_ids):
+        # Returns {id: record} for the users that exist; misses are loaded in one query
+        found, missing = {}, []
+        with self._lock:
+            for user_id in set(user_ids):
+                record = self._lookup(user_id)
+                if record is None:
+                    missing.append(user_id)
+                else:
+                    found[user_id] = record
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            records = self._load(User.id.in_(missing))
+            found.update((record['id'], record) for record in records)
+        return found
+
+    def get(self, user_id):
+        return self.get_many([user_id]).get(user_id)
+
+    def get_current(self, user_id):
+        # For a user's own profile: the cached record is used only while users.updated_at
+        # is unchanged, so a change made through another server process shows up at once
+        row = db.session.execute(select(User.updated_at).where(User.id == user_id),
+                                 bind_arguments={'bind': db.engine}).first()
+        with self._lock:
+            entry = self._records.get(user_id)
+            if row is not None and entry is not None and entry[2] == row.updated_at:
+                record = self._lookup(user_id)
+                if record is not None:
+                    self.hits += 1
+                    return record
+            self.misses += 1
+            self._discard(user_id)
+        if row is None:
+            return None
+        records = self._load(User.id == user_id)
+        return records[0] if records else None
+
+    def get_by_username(self, username):
+        with self._lock:
+            user_id = self._ids_by_username.get(username)
+            record = self._lookup(user_id) if user_id is not None else None
+            if record is not None:
+                self.hits += 1
+                return record
+            self.misses += 1
+
+        # Unknown names are not cached, so a user who registers later is found right away
+        records = self._load(User.username == username)
+        return records[0] if records else None
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._discard(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._ids_by_username.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._records),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+def init_user_cache(app):
+    app.extensions['user_cache'] = UserCache(app.config.get('USER_CACHE_SIZE', 10000),
+                                             app.config.get('USER_CACHE_TTL', 300))
+
+
+def get_user_cache():
+    return current_app.extensions['user_cache']
+
+
+# Records are dropped when a user is flushed and again after commit, so a request that
+# re-reads the user between flush and commit cannot keep the old values cached
+def _user_changed(mapper, connection, target):
+    if has_app_context() and 'user_cache' in current_app.extensions:
+        get_user_cache().invalidate(target.id)
+        Session.object_session(target).info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+def _session_committed(session):
+    user_ids = session.info.pop('changed_user_ids', None)
+    if user_ids and has_app_context() and 'user_cache' in current_app.extensions:
+        for user_id in user_ids:
+            get_user_cache().invalidate(user_id)
+
+
+event.listen(User, 'after_update', _user_changed)
+event.listen(User, 'after_delete', _user_changed)
+event.listen(Session, 'after_commit', _session_committed)
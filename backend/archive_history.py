@@ -0,0 +1,28 @@
+# --- Архивация старой истории документов ---
+# Переносит записи document_history старше заданного срока в сжатые сегменты
+# document_history_archive. Можно запускать по расписанию и прерывать в любой момент
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from app import create_app
+from app.history_archive import archive_history, SEGMENT_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move old document history into the archive')
+    parser.add_argument('--days', type=int, help='archive entries older than this many days '
+                                                 '(default: HISTORY_ARCHIVE_AFTER_DAYS)')
+    parser.add_argument('--segment-size', type=int, default=SEGMENT_SIZE, help='entries moved per transaction')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        days = args.days if args.days is not None else app.config['HISTORY_ARCHIVE_AFTER_DAYS']
+        moved = archive_history(days, args.segment_size)
+        print(f'Archived {moved} history entries older than {days} days')
+
+
+if __name__ == '__main__':
+    main()
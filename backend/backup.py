@@ -0,0 +1,76 @@
+# --- Резервное копирование базы данных и загруженных файлов ---
+# snapshot — снимок (первый полный, следующие только с изменениями), list — список снимков,
+# verify — проверка целостности, restore — восстановление на выбранный снимок или момент времени
+import argparse
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from app import create_app
+from app.backup import BackupError, create_snapshot, find_snapshot, list_snapshots, restore_snapshot, verify_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Back up the database and uploaded files')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    snapshot = commands.add_parser('snapshot', help='take a snapshot')
+    snapshot.add_argument('--full', action='store_true', help='copy everything instead of changes since the last one')
+    snapshot.add_argument('--workers', type=int, default=4, help='threads copying files')
+
+    commands.add_parser('list', help='list snapshots')
+
+    verify = commands.add_parser('verify', help='check a snapshot and everything it depends on')
+    verify.add_argument('snapshot', nargs='?', help='snapshot id (default: the latest)')
+    verify.add_argument('--full', action='store_true', help='re-hash every stored file')
+
+    restore = commands.add_parser('restore', help='restore the database and files')
+    target = restore.add_mutually_exclusive_group(required=True)
+    target.add_argument('snapshot', nargs='?', help='snapshot id')
+    target.add_argument('--at', type=datetime.fromisoformat, help='latest snapshot at or before this UTC time')
+    restore.add_argument('--clear', action='store_true', help='replace the current contents of the database')
+    restore.add_argument('--skip-files', action='store_true', help='restore the database only')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        try:
+            if args.command == 'snapshot':
+                manifest = create_snapshot(full=args.full, workers=args.workers)
+                changed = sum(info['changed'] for info in manifest['tables'].values())
+                deleted = sum(info['deleted'] for info in manifest['tables'].values())
+                kind = f'incremental on {manifest["parent"]}' if manifest['parent'] else 'full'
+                print(f'Snapshot {manifest["id"]} ({kind}): {changed} rows, {deleted} deletions, '
+                      f'{manifest["files"]["copied_bytes"]} bytes of new files')
+                for error in manifest['errors']:
+                    print(f'Warning: {error}')
+                if manifest['errors']:
+                    sys.exit(1)
+
+            elif args.command == 'list':
+                for manifest in list_snapshots():
+                    changed = sum(info['changed'] for info in manifest['tables'].values())
+                    print(f'{manifest["id"]}  {manifest["created_at"]}  parent={manifest["parent"] or "-"}  '
+                          f'rows={changed}  files={manifest["files"]["total"]}')
+
+            elif args.command == 'verify':
+                snapshot_id = args.snapshot or find_snapshot()
+                problems = verify_snapshot(snapshot_id, full=args.full)
+                for problem in problems:
+                    print(problem)
+                print(f'Snapshot {snapshot_id}: {"FAILED" if problems else "OK"}')
+                if problems:
+                    sys.exit(1)
+
+            elif args.command == 'restore':
+                snapshot_id = args.snapshot or find_snapshot(args.at)
+                restored = restore_snapshot(snapshot_id, clear=args.clear, files=not args.skip_files)
+                print(f'Restored snapshot {snapshot_id}, {restored} files copied')
+        except BackupError as e:
+            print(f'Error: {e}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# --- Бенчмарк списочных запросов ---
+# Заполняет временную SQLite-базу большим количеством документов, сообщений и записей истории
+# и сравнивает время ответа списочных эндпоинтов с индексами и без них
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import Config
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert, text
+from app import create_app, db
+from app.models import User, Document, DocumentHistory, Message
+
+STATUSES = ['draft', 'pending', 'approved', 'rejected']
+TYPES = ['general', 'contract', 'report', 'invoice', 'memo']
+BATCH_SIZE = 10000
+
+
+def seed(rows, users):
+    start = datetime(2020, 1, 1)
+
+    db.session.execute(insert(User), [{
+        'username': f'user{i}',
+        'email': f'user{i}@example.com',
+        'password_hash': 'x',
+        'role': 'admin' if i == 1 else 'user',
+        'created_at': start,
+    } for i in range(1, users + 1)])
+
+    for offset in range(0, rows, BATCH_SIZE):
+        batch = range(offset, min(offset + BATCH_SIZE, rows))
+        db.session.execute(insert(Document), [{
+            'title': f'Document {i}',
+            'type': random.choice(TYPES),
+            'file_path': f'{i}.pdf',
+            'status': random.choice(STATUSES),
+            'author_id': random.randint(1, users),
+            'content': 'x' * 200,
+            'created_at': start + timedelta(minutes=i),
+            'updated_at': start + timedelta(minutes=i),
+        } for i in batch])
+        db.session.execute(insert(Message), [{
+            'sender_id': random.randint(1, users),
+            'recipient_id': random.randint(1, users),
+            'subject': f'Subject {i}',
+            'body': 'x' * 200,
+            'timestamp': start + timedelta(minutes=i),
+            'read': False,
+        } for i in batch])
+        db.session.execute(insert(DocumentHistory), [{
+            'document_id': random.randint(1, rows),
+            'action': 'updated',
+            'user_id': random.randint(1, users),
+            'timestamp': start + timedelta(minutes=i),
+        } for i in batch])
+    db.session.commit()
+
+
+def measure(client, url, headers, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return statistics.median(timings)
+
+
+def run_scenarios(client, admin, user, repeat):
+    scenarios = [
+        ('documents, admin, first page', '/api/documents', admin),
+        ('documents, status=pending', '/api/documents?status=pending', admin),
+        ('documents, type=contract', '/api/documents?type=contract', admin),
+        ('documents, own (non-admin)', '/api/documents', user),
+        ('messages, inbox', '/api/messages', user),
+        ('messages, sent', '/api/messages?folder=sent', user),
+        ('document history', '/api/documents/1/history', admin),
+    ]
+    return [(name, measure(client, url, headers, repeat)) for name, url, headers in scenarios]
+
+
+def drop_indexes():
+    for table in (Document.__table__, Message.__table__, DocumentHistory.__table__):
+        for index in table.indexes:
+            db.session.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark list endpoints with and without indexes')
+    parser.add_argument('--rows', type=int, default=100000, help='documents, messages and history rows to create')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp_dir, 'benchmark.db')
+        UPLOAD_FOLDER = os.path.join(tmp_dir, 'uploads')
+
+    app = create_app(BenchmarkConfig)
+    client = app.test_client()
+    random.seed(0)
+
+    with app.app_context():
+        db.create_all()
+        print(f'Seeding {args.rows} rows per table...')
+        seed(args.rows, args.users)
+        db.session.execute(text('ANALYZE'))
+
+        admin = {'Authorization': 'Bearer ' + create_access_token(identity=1, additional_claims={'role': 'admin'})}
+        user = {'Authorization': 'Bearer ' + create_access_token(identity=2, additional_claims={'role': 'user'})}
+
+        indexed = run_scenarios(client, admin, user, args.repeat)
+        drop_indexes()
+        unindexed = run_scenarios(client, admin, user, args.repeat)
+
+    print(f'{"scenario":<32}{"indexed, ms":>14}{"no indexes, ms":>16}')
+    for (name, with_ms), (_, without_ms) in zip(indexed, unindexed):
+        print(f'{name:<32}{with_ms:>14.1f}{without_ms:>16.1f}')
+
+
+if __name__ == '__main__':
+    main()
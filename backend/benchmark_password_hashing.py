@@ -0,0 +1,86 @@
+# --- Бенчмарк хеширования паролей ---
+# Измеряет, сколько входов в секунду выдерживает /api/auth/login при хешировании
+# в потоке запроса и в пуле процессов, для разных алгоритмов и стоимости хеша
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from config import Config
+from app import create_app, db
+from app.models import User
+from app.passwords import shutdown_executor
+
+
+def run_logins(app, users, threads, seconds):
+    # Every thread logs in as its own user until the time is up; returns successful logins
+    deadline = time.perf_counter() + seconds
+    counts = [0] * threads
+
+    def worker(index):
+        client = app.test_client()
+        username = f'user{index % users}'
+        while time.perf_counter() < deadline:
+            response = client.post('/api/auth/login', json={'username': username, 'password': 'password'})
+            assert response.status_code == 200, response.get_data(as_text=True)
+            counts[index] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return sum(counts), time.perf_counter() - started
+
+
+def benchmark(method, workers, threads, seconds):
+    tmp_dir = tempfile.mkdtemp()
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp_dir, 'benchmark.db')
+        UPLOAD_FOLDER = os.path.join(tmp_dir, 'uploads')
+        PASSWORD_HASH_METHOD = method
+        PASSWORD_HASH_WORKERS = workers
+        PASSWORD_HASH_TIMEOUT = 60
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        db.create_all()
+        users = max(threads, 1)
+        for i in range(users):
+            user = User(username=f'user{i}', email=f'user{i}@example.com')
+            user.set_password('password')
+            db.session.add(user)
+        db.session.commit()
+
+    try:
+        logins, elapsed = run_logins(app, users, threads, seconds)
+    finally:
+        shutdown_executor()
+
+    # Hashing dominates a login, so the cores it can use are the pool size (or one inline)
+    cores = min(workers, os.cpu_count() or 1) if workers else 1
+    return logins / elapsed, logins / elapsed / cores
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark login throughput for password hashing settings')
+    parser.add_argument('--methods', nargs='+', default=[Config.PASSWORD_HASH_METHOD, 'pbkdf2:sha256:100000'],
+                        help='Werkzeug hash methods with their cost')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='hashing processes for the pool run')
+    parser.add_argument('--seconds', type=float, default=5.0, help='duration of every measurement')
+    args = parser.parse_args()
+
+    print(f'{"method":<28}{"mode":<14}{"logins/s":>10}{"per core":>10}')
+    for method in args.methods:
+        for mode, workers, threads in (('inline', 0, 1), (f'pool x{args.workers}', args.workers, args.workers * 2)):
+            total, per_core = benchmark(method, workers, threads, args.seconds)
+            print(f'{method:<28}{mode:<14}{total:>10.1f}{per_core:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,137 +1,353 @@
 # --- Скрипт для экспорта базы данных ---
-# Экспортирует данные из PostgreSQL в SQLite, копирует структуру и данные таблиц
+# Экспортирует данные из PostgreSQL в SQLite, копирует структуру и данные таблиц.
+# Таблицы читаются параллельно потоковыми (server-side) курсорами, а записываются пакетами:
+# один executemany и одна транзакция на пакет. Экспорт пишется во временный файл <output>.partial
+# и переименовывается в output только в конце. Прогресс хранится в этом файле,
+# поэтому прерванный экспорт продолжается с места остановки (--resume)
+import argparse
+import json
 import os
-import subprocess
+import queue
+import re
 import sys
-from sqlalchemy import create_engine, inspect
-from sqlalchemy.orm import sessionmaker
-import json
-import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import (Column, Integer, MetaData, String, Table, Text, TypeDecorator, create_engine, event,
+                        func, insert, inspect, select, text, tuple_)
+from sqlalchemy.types import ARRAY, JSON, Enum, Uuid
 
-# Try to determine the actual database URL from config
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from config import Config
+from app.change_tracking import UNTRACKED_TABLES, trigger_ddl
+from app.database import normalize_database_url
+from app.search import SEARCH_COLUMNS, SEARCH_TABLE_PREFIXES, SQLITE_DOCUMENTS_DDL, SQLITE_MESSAGES_DDL
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'document_management.db')
+PARTIAL_SUFFIX = '.partial'  # The output gets its final name only once the export is complete
+PROGRESS_TABLE = '_export_progress'
+PROGRESS_INTERVAL = 2.0  # Seconds between progress lines for the same table
+
+progress_table = Table(
+    PROGRESS_TABLE, MetaData(),
+    Column('table_name', String, primary_key=True),
+    Column('last_key', Text),  # JSON list of primary key values of the last copied row
+    Column('rows', Integer, nullable=False, default=0),
+    Column('done', Integer, nullable=False, default=0),
+)
+
+
+class AsText(TypeDecorator):
+    # Values SQLite has no type for (UUID, tsvector, ranges...) are kept as their text form
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else str(value)
+
+
+# --- Перенос схемы ---
+
+def sqlite_type(type_):
+    if isinstance(type_, (JSON, ARRAY)):
+        return JSON()
+    if isinstance(type_, Enum):
+        return String()
+    try:
+        generic = type_.as_generic()
+    except NotImplementedError:
+        return AsText()
+    # SQLite would store UUIDs as 32 hex digits, the text form stays readable by the app
+    return AsText() if isinstance(generic, Uuid) else generic
+
+
+def sqlite_default(default):
+    # Plain literals are kept ("0", "'draft'::character varying"); sequences and functions are not
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?|'[^']*')(?:::[\w ]+)?", (default or '').strip())
+    return text(match.group(1)) if match else None
+
+
+def copy_schema(source_metadata, columns_to_skip=SEARCH_COLUMNS):
+    # Copies reflected tables with SQLite-compatible types. Indexes are returned separately
+    # and built after the data is loaded, which is much faster than maintaining them per row
+    target = MetaData()
+    indexes = {}
+    for table in source_metadata.sorted_tables:
+        columns = []
+        for column in table.columns:
+            if column.name in columns_to_skip or column.computed is not None:
+                continue
+            default = sqlite_default(column.server_default.arg.text) if column.server_default is not None else None
+            columns.append(Column(column.name, sqlite_type(column.type), primary_key=column.primary_key,
+                                  nullable=column.nullable, server_default=default,
+                                  autoincrement=column.autoincrement))
+        copied = Table(table.name, target, *columns)
+        indexes[table.name] = []
+        for index in table.indexes:
+            # Partial and expression indexes (GIN, to_tsvector...) are PostgreSQL specific
+            if any(index.dialect_options[dialect].get('where') is not None for dialect in ('postgresql', 'sqlite')):
+                continue
+            names = [expression.name for expression in index.expressions if isinstance(expression, Column)]
+            if len(names) != len(index.expressions) or not all(name in copied.c for name in names):
+                continue
+            indexes[table.name].append((index.name, names, index.unique))
+    return target, indexes
+
+
+def create_indexes(connection, table, indexes):
+    for name, names, unique in indexes:
+        unique_sql = 'UNIQUE ' if unique else ''
+        columns_sql = ', '.join(f'"{name}"' for name in names)
+        connection.exec_driver_sql(f'CREATE {unique_sql}INDEX IF NOT EXISTS "{name}" ON "{table.name}" ({columns_sql})')
 
-def export_database():
-    db_url = Config.SQLALCHEMY_DATABASE_URI
-    print(f"Database URL: {db_url}")
-    
-    if 'postgresql' in db_url:
-        # For PostgreSQL, we'll create a SQLite file with the same schema and data
+
+def create_search_index(connection, tables):
+    # The SQLite full-text index is filled in one pass once the rows are in place
+    for table_name, statements in (('documents', SQLITE_DOCUMENTS_DDL), ('messages', SQLITE_MESSAGES_DDL)):
+        if table_name not in tables:
+            continue
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql(f"INSERT INTO {table_name}_fts({table_name}_fts) VALUES ('rebuild')")
+
+
+def create_delete_triggers(connection, tables):
+    # Deletions in the exported file are logged for incremental backups, as in the source database
+    if 'deleted_rows' not in tables:
+        return
+    keys = [(name, [column.name for column in table.primary_key.columns]) for name, table in tables.items()
+            if name not in UNTRACKED_TABLES and table.primary_key.columns]
+    for statement in trigger_ddl('sqlite', keys):
+        connection.exec_driver_sql(statement)
+
+
+# --- Чтение исходных таблиц ---
+
+def put_batch(batches, stop, item):
+    # Gives up once the writer has stopped, so readers never block on a full queue forever
+    while not stop.is_set():
         try:
-            # Extract connection details
-            if '://' in db_url:
-                _, connection_string = db_url.split('://', 1)
-                if '@' in connection_string:
-                    auth, location = connection_string.split('@', 1)
-                    if ':' in auth:
-                        username, password = auth.split(':', 1)
-                    else:
-                        username, password = auth, ''
-                    
-                    if '/' in location:
-                        host_port, dbname = location.split('/', 1)
-                        if ':' in host_port:
-                            host, port = host_port.split(':', 1)
-                        else:
-                            host, port = host_port, '5432'
-                    else:
-                        host, port, dbname = location, '5432', ''
-            
-            # Create SQLAlchemy engine to connect to PostgreSQL
-            engine = create_engine(db_url)
-            inspector = inspect(engine)
-            
-            # Create a new SQLite database file
-            sqlite_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'document_management.db')
-            if os.path.exists(sqlite_path):
-                os.remove(sqlite_path)
-            
-            sqlite_conn = sqlite3.connect(sqlite_path)
-            sqlite_cursor = sqlite_conn.cursor()
-            
-            # Get all tables from PostgreSQL
-            tables = inspector.get_table_names()
-            print(f"Tables found: {tables}")
-            
-            # For each table, create it in SQLite and copy data
-            for table_name in tables:
-                # Get table columns
-                columns = inspector.get_columns(table_name)
-                column_defs = []
-                
-                for column in columns:
-                    name = column['name']
-                    type_name = str(column['type'])
-                    if 'INT' in type_name.upper():
-                        type_name = 'INTEGER'
-                    elif 'VARCHAR' in type_name.upper() or 'TEXT' in type_name.upper():
-                        type_name = 'TEXT'
-                    elif 'FLOAT' in type_name.upper() or 'DOUBLE' in type_name.upper() or 'NUMERIC' in type_name.upper():
-                        type_name = 'REAL'
-                    elif 'BOOLEAN' in type_name.upper():
-                        type_name = 'INTEGER'
-                    elif 'DATETIME' in type_name.upper() or 'TIMESTAMP' in type_name.upper():
-                        type_name = 'TEXT'
-                    else:
-                        type_name = 'TEXT'
-                    
-                    nullable = "" if column.get('nullable', True) else "NOT NULL"
-                    default = f"DEFAULT {column.get('default')}" if column.get('default') is not None else ""
-                    
-                    # Special case for primary key
-                    if column.get('primary_key', False):
-                        column_def = f"{name} {type_name} PRIMARY KEY"
-                    else:
-                        column_def = f"{name} {type_name} {nullable} {default}".strip()
-                    
-                    column_defs.append(column_def)
-                
-                # Create table in SQLite
-                create_table_sql = f"CREATE TABLE {table_name} ({', '.join(column_defs)})"
-                try:
-                    sqlite_cursor.execute(create_table_sql)
-                    print(f"Created table {table_name}")
-                except sqlite3.Error as e:
-                    print(f"Error creating table {table_name}: {e}")
-                
-                # Copy data
+            batches.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def export_snapshot(source):
+    # On PostgreSQL all workers read from one snapshot, so tables are consistent with each other
+    # (like pg_dump -j). The returned connection must stay open until the workers are done
+    if source.dialect.name != 'postgresql':
+        return None, None
+    connection = source.connect().execution_options(isolation_level='REPEATABLE READ')
+    snapshot = connection.execute(text('SELECT pg_export_snapshot()')).scalar()
+    return connection, snapshot
+
+
+def read_table(source, table, columns, state, batch_size, snapshot, batches, stop):
+    # Streams one table ordered by its primary key and puts (table, rows, last_key) batches on the queue
+    key = list(table.primary_key.columns)
+    key_positions = [columns.index(column.name) for column in key]
+    query = select(*[table.c[name] for name in columns])
+    if key:
+        query = query.order_by(*key)
+        if state['last_key'] is not None:
+            last_key = json.loads(state['last_key'])
+            query = query.where(tuple_(*key) > tuple_(*last_key) if len(key) > 1 else key[0] > last_key[0])
+
+    with source.connect() as connection:
+        if snapshot:
+            connection = connection.execution_options(isolation_level='REPEATABLE READ')
+            connection.execute(text('SET TRANSACTION SNAPSHOT :snapshot'), {'snapshot': snapshot})
+        total = connection.execute(select(func.count()).select_from(table)).scalar()
+        if not put_batch(batches, stop, ('start', table.name, total)):
+            return
+        # yield_per makes psycopg2 use a named (server-side) cursor: only one batch is in memory
+        result = connection.execution_options(yield_per=batch_size).execute(query)
+        for rows in result.partitions():
+            last_key = json.dumps([rows[-1][position] for position in key_positions], default=str) if key else None
+            if not put_batch(batches, stop, ('rows', table.name, [tuple(row) for row in rows], last_key)):
+                return
+    put_batch(batches, stop, ('done', table.name))
+
+
+def read_table_safely(source, table, columns, state, batch_size, snapshot, batches, stop):
+    try:
+        read_table(source, table, columns, state, batch_size, snapshot, batches, stop)
+    except Exception as e:
+        put_batch(batches, stop, ('error', table.name, e))
+
+
+# --- Запись в SQLite ---
+
+def sqlite_files(path):
+    return path, path + '-wal', path + '-shm'
+
+
+def open_target(output, resume):
+    # Only the partial file is ever replaced; an existing output stays until the export succeeds
+    partial = output + PARTIAL_SUFFIX
+    if not resume:
+        for path in sqlite_files(partial):
+            if os.path.exists(path):
+                os.remove(path)
+    target = create_engine(f'sqlite:///{partial}')
+
+    @event.listens_for(target, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')  # Every committed batch survives a crash of the exporter
+        cursor.close()
+
+    return target
+
+
+def load_progress(connection, resume):
+    if resume and not inspect(connection).has_table(PROGRESS_TABLE):
+        raise SystemExit('Nothing to resume: there is no partially finished export of this output file')
+    progress_table.create(connection, checkfirst=True)
+    return {row.table_name: {'last_key': row.last_key, 'rows': row.rows, 'done': row.done}
+            for row in connection.execute(select(progress_table))}
+
+
+def save_progress(connection, table_name, state):
+    connection.execute(progress_table.update().where(progress_table.c.table_name == table_name).values(**state))
+
+
+def print_progress(table_name, state, total, started_at, force=False):
+    now = time.monotonic()
+    if state['printed_rows'] == state['rows'] or (not force and now - state['printed_at'] < PROGRESS_INTERVAL):
+        return
+    state.update(printed_at=now, printed_rows=state['rows'])
+    percent = f' ({state["rows"] * 100 // total}%)' if total else ''
+    rate = state['copied'] / max(now - started_at, 1e-6)
+    print(f'{table_name}: {state["rows"]}/{total} rows{percent}, {rate:.0f} rows/s', flush=True)
+
+
+def finish_target(target, output):
+    # Without WAL the partial file is self-contained and can be renamed over the output
+    with target.connect() as connection:
+        connection.exec_driver_sql('PRAGMA journal_mode=DELETE')
+    target.dispose()
+    for path in sqlite_files(output)[1:]:
+        if os.path.exists(path):
+            os.remove(path)  # A stale WAL of the old output must not be replayed into the new one
+    os.replace(output + PARTIAL_SUFFIX, output)
+
+
+def export_database(source_url, output, workers=4, batch_size=5000, resume=False):
+    source = create_engine(normalize_database_url(source_url))
+    print(f'Database URL: {source.url.render_as_string(hide_password=True)}')
+    # The default source is the SQLite fallback, which is also the default output
+    if source.dialect.name != 'postgresql':
+        raise SystemExit('The database is not PostgreSQL. It may already be a file-based database.')
+
+    # Full-text shadow tables are rebuilt on the SQLite side instead of being copied
+    source_metadata = MetaData()
+    source_metadata.reflect(bind=source, only=lambda name, _: not name.startswith(SEARCH_TABLE_PREFIXES))
+    target_metadata, indexes = copy_schema(source_metadata)
+    print(f'Tables found: {[table.name for table in source_metadata.sorted_tables]}')
+
+    target = open_target(output, resume)
+    with target.connect() as connection:
+        with connection.begin():
+            progress = load_progress(connection, resume)
+            target_metadata.create_all(connection, checkfirst=True)
+            for table in target_metadata.sorted_tables:
+                if table.name not in progress:
+                    connection.execute(insert(progress_table).values(table_name=table.name, rows=0, done=0))
+                    progress[table.name] = {'last_key': None, 'rows': 0, 'done': 0}
+                elif not progress[table.name]['done'] and not table.primary_key.columns:
+                    # Without a key there is no position to continue from, the table is copied again
+                    connection.execute(table.delete())
+                    progress[table.name].update(last_key=None, rows=0)
+                    save_progress(connection, table.name, progress[table.name])
+
+        pending = [table for table in target_metadata.sorted_tables if not progress[table.name]['done']]
+        skipped = len(target_metadata.sorted_tables) - len(pending)
+        if skipped:
+            print(f'Resuming: {skipped} tables are already exported')
+
+        batches = queue.Queue(maxsize=workers * 2)  # Bounds memory when SQLite writes slower than the source reads
+        stop = threading.Event()
+        snapshot_connection, snapshot = export_snapshot(source)
+        failed = []
+        started_at = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for table in pending:
+                    columns = [column.name for column in table.columns]
+                    pool.submit(read_table_safely, source, source_metadata.tables[table.name], columns,
+                                dict(progress[table.name]), batch_size, snapshot, batches, stop)
                 try:
-                    # Get data from PostgreSQL
-                    with engine.connect() as conn:
-                        result = conn.execute(f"SELECT * FROM {table_name}")
-                        rows = result.fetchall()
-                        
-                    if rows:
-                        # Get column names
-                        col_names = [col['name'] for col in columns]
-                        placeholders = ', '.join(['?' for _ in col_names])
-                        
-                        # Insert data into SQLite
-                        insert_sql = f"INSERT INTO {table_name} ({', '.join(col_names)}) VALUES ({placeholders})"
-                        for row in rows:
-                            # Convert row to list
-                            row_data = [str(item) if item is not None else None for item in row]
-                            sqlite_cursor.execute(insert_sql, row_data)
-                        
-                        print(f"Copied {len(rows)} rows to table {table_name}")
-                except Exception as e:
-                    print(f"Error copying data for table {table_name}: {e}")
-            
-            # Commit changes and close connections
-            sqlite_conn.commit()
-            sqlite_conn.close()
-            
-            print(f"Database exported to {sqlite_path}")
-            
-        except Exception as e:
-            print(f"Error exporting database: {e}")
-            raise
-    else:
-        print("The database is not PostgreSQL. It may already be a file-based database.")
-
-# --- Основная функция экспорта ---
-if __name__ == "__main__":
-    export_database()
-
-# --- Запуск скрипта --- 
\ No newline at end of file
+                    # SQLite allows one writer, so all batches are written from this thread
+                    remaining = len(pending)
+                    totals = {}
+                    while remaining:
+                        item = batches.get()
+                        kind, table_name = item[0], item[1]
+                        table = target_metadata.tables[table_name]
+                        state = progress[table_name]
+                        if kind == 'start':
+                            totals[table_name] = item[2]
+                            state.update(copied=0, printed_at=0.0, printed_rows=None)
+                        elif kind == 'rows':
+                            rows, state['last_key'] = item[2], item[3]
+                            names = [column.name for column in table.columns]
+                            with connection.begin():
+                                connection.execute(insert(table), [dict(zip(names, row)) for row in rows])
+                                state['rows'] += len(rows)
+                                state['copied'] += len(rows)
+                                save_progress(connection, table_name, {'last_key': state['last_key'],
+                                                                       'rows': state['rows']})
+                            print_progress(table_name, state, totals[table_name], started_at)
+                        elif kind == 'done':
+                            with connection.begin():
+                                create_indexes(connection, table, indexes[table_name])
+                                save_progress(connection, table_name, {'done': 1})
+                            print_progress(table_name, state, totals[table_name], started_at, force=True)
+                            remaining -= 1
+                        else:
+                            print(f'Error copying data for table {table_name}: {item[2]}')
+                            failed.append(table_name)
+                            remaining -= 1
+                finally:
+                    stop.set()
+        finally:
+            if snapshot_connection is not None:
+                snapshot_connection.close()
+
+        if failed:
+            print(f'Export incomplete, failed tables: {failed}. Fix the cause and run again with --resume')
+            return False
+
+        with connection.begin():
+            create_search_index(connection, target_metadata.tables)
+            create_delete_triggers(connection, target_metadata.tables)
+            progress_table.drop(connection)
+
+    finish_target(target, output)
+    print(f'Database exported to {output}')
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the database to a SQLite file')
+    parser.add_argument('--source', default=Config.SQLALCHEMY_DATABASE_URI, help='database URL to export')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='SQLite file to create')
+    parser.add_argument('--workers', type=int, default=4, help='tables read in parallel')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per fetch and per transaction')
+    parser.add_argument('--resume', action='store_true', help='continue an interrupted export into --output')
+    args = parser.parse_args()
+
+    try:
+        finished = export_database(args.source, args.output, args.workers, args.batch_size, args.resume)
+    except KeyboardInterrupt:
+        print('Interrupted, run again with --resume to continue')
+        sys.exit(130)
+    sys.exit(0 if finished else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# --- Фоновый обработчик извлечения текста ---
+# Забирает задания из таблицы extraction_jobs и записывает текст файлов в Document.content.
+# Можно запускать несколько процессов одновременно и перезапускать в любой момент
+import argparse
+import multiprocessing
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from app import create_app
+from app.extraction import enqueue_missing, run_worker
+
+
+def work(poll_interval, once):
+    app = create_app()
+    with app.app_context():
+        processed = run_worker(poll_interval=poll_interval, once=once)
+        if once:
+            print(f'Processed {processed} jobs')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract text from uploaded documents')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='seconds to wait when the queue is empty')
+    parser.add_argument('--once', action='store_true', help='drain the queue and exit')
+    parser.add_argument('--backfill', action='store_true', help='queue documents that were never extracted')
+    args = parser.parse_args()
+
+    if args.backfill:
+        app = create_app()
+        with app.app_context():
+            print(f'Queued {enqueue_missing()} documents')
+
+    if args.workers == 1:
+        work(args.poll_interval, args.once)
+        return
+
+    processes = [multiprocessing.Process(target=work, args=(args.poll_interval, args.once))
+                 for _ in range(args.workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
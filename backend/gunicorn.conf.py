@@ -0,0 +1,18 @@
+# --- Настройки gunicorn для продакшена ---
+# Поток событий /api/events держит соединение открытым, поэтому воркеры асинхронные (gevent):
+# открытый поток занимает гринлет, а не целый процесс. События между воркерами передаются
+# через PostgreSQL LISTEN/NOTIFY (EVENT_BROKER=postgres). Запуск: gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:5000'
+workers = int(os.environ.get('GUNICORN_WORKERS') or multiprocessing.cpu_count() * 2 + 1)
+worker_class = 'gevent'
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS') or 1000)  # Open requests and streams per worker
+timeout = 60
+
+
+def post_fork(server, worker):
+    # Makes psycopg2 yield to other greenlets while it waits for the database
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
@@ -0,0 +1,93 @@
+"""add full-text search
+
+Revision ID: 5c1d7e2a9f40
+Revises: 883c0c453f67
+Create Date: 2026-10-18 13:30:12.418204
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1d7e2a9f40'
+down_revision = '883c0c453f67'
+branch_labels = None
+depends_on = None
+
+# The DDL is copied here rather than imported from app/search.py, so that later
+# changes to the application do not change what this revision does
+SQLITE_DOCUMENTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+        title, content, content='documents', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_ai AFTER INSERT ON documents BEGIN
+        INSERT INTO documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_ad AFTER DELETE ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+    END""",
+    # Only changes to the indexed text touch the index; status updates do not
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_au AFTER UPDATE OF title, content ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, title, content)
+        VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO documents_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END""",
+]
+
+SQLITE_MESSAGES_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        subject, content='messages', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, subject) VALUES (new.id, new.subject);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, subject) VALUES ('delete', old.id, old.subject);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF subject ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, subject) VALUES ('delete', old.id, old.subject);
+        INSERT INTO messages_fts(rowid, subject) VALUES (new.id, new.subject);
+    END""",
+]
+
+POSTGRES_DOCUMENTS_DDL = [
+    """ALTER TABLE documents ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(content, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_documents_search_vector ON documents USING gin (search_vector)",
+]
+
+POSTGRES_MESSAGES_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_messages_subject_search ON messages USING gin (to_tsvector('simple', subject))",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DOCUMENTS_DDL + SQLITE_MESSAGES_DDL:
+            op.execute(statement)
+        # Index the rows that already exist
+        op.execute("INSERT INTO documents_fts(documents_fts) VALUES ('rebuild')")
+        op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        # The generated column is computed for existing rows when it is added
+        for statement in POSTGRES_DOCUMENTS_DDL + POSTGRES_MESSAGES_DDL:
+            op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for name in ('documents_fts_ai', 'documents_fts_ad', 'documents_fts_au',
+                     'messages_fts_ai', 'messages_fts_ad', 'messages_fts_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {name}')
+        op.execute('DROP TABLE IF EXISTS documents_fts')
+        op.execute('DROP TABLE IF EXISTS messages_fts')
+    elif dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_messages_subject_search')
+        op.execute('DROP INDEX IF EXISTS ix_documents_search_vector')
+        op.execute('ALTER TABLE documents DROP COLUMN IF EXISTS search_vector')
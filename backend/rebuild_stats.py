@@ -0,0 +1,23 @@
+# --- Пересчёт сводной статистики документов ---
+# Заполняет таблицу document_stats заново по таблице documents, например после
+# ручного изменения данных в базе или восстановления из резервной копии
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from app import create_app
+from app.document_stats import rebuild_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the document statistics table from scratch')
+    parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print(f'Rebuilt document stats: {rebuild_stats()} rows')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 from app import create_app
 
-app = create_app()
-
+# Only under __main__: the password hashing pool spawns processes that import this module again
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app = create_app()
+    app.run(debug=True)
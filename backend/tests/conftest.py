@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import create_app, db
+from config import Config
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    # Builds an app on a fresh SQLite file; keyword arguments override config values.
+    # create_tables=False leaves the schema to the test, e.g. to run the migrations
+    def factory(create_tables=True, **overrides):
+        class TestConfig(Config):
+            TESTING = True
+            SECRET_KEY = 'test-secret-key'
+            JWT_SECRET_KEY = 'test-jwt-secret-key-of-sufficient-length'
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'db.sqlite')
+            UPLOAD_FOLDER = str(tmp_path / 'uploads')
+            BACKUP_FOLDER = str(tmp_path / 'backups')
+            PASSWORD_HASH_WORKERS = 0  # Hash inline, no process pool in tests
+            REPLICA_DATABASE_URI = None
+
+        for key, value in overrides.items():
+            setattr(TestConfig, key, value)
+        app = create_app(TestConfig)
+        if create_tables:
+            with app.app_context():
+                db.create_all(bind_key=None)  # The replica bind, if any, is prepared by the test
+        return app
+
+    return factory
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def register():
+    # The first registered user becomes an admin
+    def register_user(client, username, password='password'):
+        response = client.post('/api/auth/register', json={
+            'username': username, 'email': f'{username}@example.com', 'password': password
+        })
+        assert response.status_code == 201, response.get_json()
+        return {'Authorization': f'Bearer {response.get_json()["access_token"]}'}
+
+    return register_user
@@ -0,0 +1,66 @@
+import io
+import os
+from datetime import timedelta
+
+from app import backup, db
+from app.models import Document, Message, UploadSession
+
+
+def upload(client, headers, title, content):
+    response = client.post('/api/documents', headers=headers, content_type='multipart/form-data',
+                           data={'title': title, 'file': (io.BytesIO(content), f'{title}.txt')})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['document']
+
+
+def test_incremental_snapshot_holds_only_changes(make_app, register, tmp_path, monkeypatch):
+    # Everything here happens within seconds, the overlap would copy it all again
+    monkeypatch.setattr(backup, 'CHANGE_OVERLAP', timedelta(0))
+    app = make_app()
+    client = app.test_client()
+    alice = register(client, 'alice')
+    bob = register(client, 'bob')
+    upload(client, alice, 'Report', b'report')
+    upload_id = client.post('/api/documents/uploads', headers=alice,
+                            json={'title': 'Draft', 'file_name': 'draft.txt', 'size': 5}).get_json()['upload_id']
+    message = client.post('/api/messages', headers=alice,
+                          json={'recipient': 'bob', 'subject': 'Hi', 'body': 'b'}).get_json()['message_data']
+    with app.app_context():
+        first = backup.create_snapshot()
+
+    assert client.put(f'/api/messages/{message["id"]}/read', headers=bob).status_code == 200
+    upload(client, alice, 'Plan', b'plan')
+    assert client.delete(f'/api/documents/uploads/{upload_id}', headers=alice).status_code == 200
+    with app.app_context():
+        second = backup.create_snapshot()
+
+    assert first['parent'] is None and second['parent'] == first['id']
+    tables = second['tables']
+    assert tables['documents']['changed'] == 1
+    assert tables['messages']['changed'] == 1
+    assert tables['upload_sessions'] == dict(tables['upload_sessions'], changed=0, deleted=1)
+    assert tables['document_history_archive']['changed'] == 0
+    assert second['files']['total'] == 1
+
+    # Restore the chain into another database and upload folder
+    restored = make_app(SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmp_path / 'restored.sqlite'),
+                        UPLOAD_FOLDER=str(tmp_path / 'restored_uploads'))
+    with restored.app_context():
+        assert backup.restore_snapshot(second['id']) == 2
+        assert sorted(document.title for document in Document.query) == ['Plan', 'Report']
+        assert [message.read for message in Message.query] == [True]
+        assert UploadSession.query.count() == 0
+        for document in Document.query:
+            assert os.path.exists(os.path.join(restored.config['UPLOAD_FOLDER'], document.file_path))
+
+        # Restored rows keep their old timestamps, so the next snapshot starts a new chain
+        assert backup.create_snapshot()['parent'] is None
+
+
+def test_deletions_are_logged(app):
+    with app.app_context():
+        db.session.execute(db.text("INSERT INTO blobs (sha256, size, ref_count) VALUES ('ab', 1, 0)"))
+        db.session.execute(db.text("DELETE FROM blobs"))
+        db.session.commit()
+        rows = db.session.execute(db.text('SELECT table_name, row_key FROM deleted_rows')).all()
+    assert [tuple(row) for row in rows] == [('blobs', '["ab"]')]
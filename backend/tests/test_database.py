@@ -0,0 +1,34 @@
+from app.database import engine_options, limit_request_statements
+
+
+class FakeConnection:
+    def __init__(self, dialect):
+        self.dialect = type('Dialect', (), {'name': dialect})()
+        self.statements = []
+
+    def exec_driver_sql(self, statement):
+        self.statements.append(statement)
+
+
+def test_statement_timeout_is_not_set_for_every_connection():
+    options = engine_options({'DB_STATEMENT_TIMEOUT_MS': 1000}, 'postgresql+psycopg2://user@host/db')
+    assert options['connect_args'] == {'connect_timeout': 10}
+
+
+def test_statement_timeout_applies_to_request_transactions_only(make_app):
+    app = make_app(DB_STATEMENT_TIMEOUT_MS=1500)
+
+    with app.app_context():
+        # Migrations and maintenance scripts run with an app context but no request
+        connection = FakeConnection('postgresql')
+        limit_request_statements(None, None, connection)
+        assert connection.statements == []
+
+    with app.test_request_context():
+        connection = FakeConnection('postgresql')
+        limit_request_statements(None, None, connection)
+        assert connection.statements == ['SET LOCAL statement_timeout = 1500']
+
+        connection = FakeConnection('sqlite')
+        limit_request_statements(None, None, connection)
+        assert connection.statements == []
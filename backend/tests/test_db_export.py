@@ -0,0 +1,50 @@
+import sqlite3
+import sys
+
+import pytest
+
+import db_export
+from config import Config
+
+
+def test_default_invocation_leaves_the_database_alone(tmp_path, monkeypatch):
+    # Without arguments the source is the SQLite fallback and the output is that same file
+    database = tmp_path / 'document_management.db'
+    with sqlite3.connect(database) as connection:
+        connection.execute('CREATE TABLE items (id INTEGER PRIMARY KEY)')
+        connection.executemany('INSERT INTO items VALUES (?)', [(i,) for i in range(100)])
+    connection.close()
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{database}')
+    monkeypatch.setattr(db_export, 'DEFAULT_OUTPUT', str(database))
+    monkeypatch.setattr(sys, 'argv', ['db_export.py'])
+
+    with pytest.raises(SystemExit) as exit_info:
+        db_export.main()
+
+    assert exit_info.value.code != 0
+    with sqlite3.connect(database) as connection:
+        assert connection.execute('SELECT count(*) FROM items').fetchone() == (100,)
+    connection.close()
+    assert not (tmp_path / 'document_management.db.partial').exists()
+
+
+def test_finished_export_replaces_the_output(tmp_path):
+    output = str(tmp_path / 'export.db')
+    with sqlite3.connect(output) as connection:
+        connection.execute('CREATE TABLE old (id INTEGER PRIMARY KEY)')
+    connection.close()
+    (tmp_path / 'export.db-wal').write_bytes(b'stale')
+
+    target = db_export.open_target(output, resume=False)
+    with target.begin() as connection:
+        connection.exec_driver_sql('CREATE TABLE new (id INTEGER PRIMARY KEY)')
+    # Until the export finishes, the previous output is untouched
+    with sqlite3.connect(output) as connection:
+        assert connection.execute("SELECT name FROM sqlite_master").fetchall() == [('old',)]
+    connection.close()
+
+    db_export.finish_target(target, output)
+    with sqlite3.connect(output) as connection:
+        assert connection.execute("SELECT name FROM sqlite_master").fetchall() == [('new',)]
+    connection.close()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['export.db']
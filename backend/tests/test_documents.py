@@ -0,0 +1,206 @@
+import hashlib
+import io
+import os
+import zipfile
+
+from app import db
+from app.models import Blob, Document, DocumentHistory
+from app.documents.routes import MAX_BULK_IDS
+from tests.test_list_queries import count_statements
+
+
+def upload(client, headers, title, content, file_name=None):
+    response = client.post('/api/documents', headers=headers, content_type='multipart/form-data',
+                           data={'title': title, 'file': (io.BytesIO(content), file_name or f'{title}.txt')})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['document']
+
+
+def test_listing_leaves_out_the_content(app, client, register):
+    headers = register(client, 'admin')
+    document = upload(client, headers, 'Report', b'report text')
+    with app.app_context():
+        db.session.get(Document, document['id']).content = 'report text'
+        db.session.commit()
+
+    with count_statements(app) as statements:
+        response = client.get('/api/documents', headers=headers)
+    assert response.status_code == 200
+    assert 'content' not in response.get_json()['items'][0]
+    assert not any('documents.content' in statement for statement in statements)
+
+    response = client.get('/api/documents?fields=title,content', headers=headers)
+    assert response.get_json()['items'] == [{'id': document['id'], 'title': 'Report', 'content': 'report text'}]
+
+
+def test_unknown_fields_are_rejected(client, register):
+    headers = register(client, 'admin')
+    response = client.get('/api/documents?fields=title,password_hash', headers=headers)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid fields: password_hash'}
+
+
+def test_file_download_supports_etag_and_ranges(client, register):
+    headers = register(client, 'admin')
+    content = b'0123456789abcdef'
+    document = upload(client, headers, 'Scan', content, 'scan.pdf')
+    url = f'/api/documents/{document["id"]}/file'
+
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.headers['ETag'] == f'"{hashlib.sha256(content).hexdigest()}"'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert 'private' in response.headers['Cache-Control']
+
+    response = client.get(url, headers={**headers, 'If-None-Match': response.headers['ETag']})
+    assert response.status_code == 304
+    assert response.data == b''
+
+    response = client.get(url, headers={**headers, 'Range': 'bytes=4-7'})
+    assert response.status_code == 206
+    assert response.data == b'4567'
+    assert response.headers['Content-Range'] == f'bytes 4-7/{len(content)}'
+
+    # A range for an older copy of the file is answered with the whole current file
+    response = client.get(url, headers={**headers, 'Range': 'bytes=4-7', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == content
+
+
+def test_proxy_serves_the_file_with_x_accel_redirect(make_app, register):
+    client = make_app(FILE_OFFLOAD='x-accel-redirect', USE_X_SENDFILE=True).test_client()
+    headers = register(client, 'admin')
+    document = upload(client, headers, 'Scan', b'0123456789', 'scan.pdf')
+
+    response = client.get(f'/api/documents/{document["id"]}/file', headers={**headers, 'Range': 'bytes=0-3'})
+    assert response.status_code == 200
+    assert response.headers['X-Accel-Redirect'] == '/protected-uploads/' + document['file_path']
+    assert 'X-Sendfile' not in response.headers
+    assert response.data == b''
+
+
+def archive_members(response):
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        assert archive.testzip() is None
+        return {info.filename: (archive.read(info), info.compress_type) for info in archive.infolist()}
+
+
+def test_zip_download_streams_the_readable_documents(app, client, register):
+    admin = register(client, 'admin')
+    alice = register(client, 'alice')
+    first = upload(client, alice, 'First', b'first text', 'notes.txt')
+    second = upload(client, alice, 'Second', b'second text', 'notes.txt')
+    scan = upload(client, alice, 'Scan', b'%PDF scan', 'scan.pdf')
+    other = upload(client, admin, 'Other', b'admin text', 'other.txt')
+
+    response = client.get('/api/documents/archive', headers=alice)
+    assert response.is_streamed
+    assert response.mimetype == 'application/zip'
+    assert archive_members(response) == {
+        f'{first["id"]}_notes.txt': (b'first text', zipfile.ZIP_DEFLATED),
+        f'{second["id"]}_notes.txt': (b'second text', zipfile.ZIP_DEFLATED),
+        f'{scan["id"]}_scan.pdf': (b'%PDF scan', zipfile.ZIP_STORED),
+    }
+
+    # Ids of documents the user may not read are left out, as are files missing from disk
+    os.remove(os.path.join(app.config['UPLOAD_FOLDER'], second['file_path']))
+    response = client.get(f'/api/documents/archive?ids={second["id"]},{scan["id"]},{other["id"]}', headers=alice)
+    assert list(archive_members(response)) == [f'{scan["id"]}_scan.pdf']
+
+    assert client.get(f'/api/documents/archive?ids={other["id"]}', headers=alice).status_code == 404
+    assert client.get('/api/documents/archive?ids=1,x', headers=alice).status_code == 400
+
+
+def test_bulk_status_update_reports_every_id(app, client, register):
+    admin = register(client, 'admin')
+    alice = register(client, 'alice')
+    first = upload(client, alice, 'First', b'first')
+    second = upload(client, alice, 'Second', b'second')
+
+    response = client.put('/api/documents/status', headers=admin,
+                          json={'ids': [second['id'], 999, first['id'], second['id']], 'status': 'approved'})
+    assert response.status_code == 200
+    assert response.get_json()['results'] == [
+        {'id': second['id'], 'status': 'updated'},
+        {'id': 999, 'status': 'not_found'},
+        {'id': first['id'], 'status': 'updated'},
+    ]
+    with app.app_context():
+        assert {document.status for document in Document.query} == {'approved'}
+        assert DocumentHistory.query.filter_by(action='status_changed_to_approved').count() == 2
+
+
+def test_bulk_status_update_is_limited(client, register):
+    admin = register(client, 'admin')
+    alice = register(client, 'alice')
+
+    response = client.put('/api/documents/status', headers=admin,
+                          json={'ids': list(range(1, MAX_BULK_IDS + 2)), 'status': 'approved'})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': f'At most {MAX_BULK_IDS} documents can be updated at once'}
+    assert client.put('/api/documents/status', headers=admin,
+                      json={'ids': list(range(1, MAX_BULK_IDS + 1)), 'status': 'approved'}).status_code == 200
+    assert client.put('/api/documents/status', headers=admin,
+                      json={'ids': ['1'], 'status': 'approved'}).status_code == 400
+    assert client.put('/api/documents/status', headers=alice,
+                      json={'ids': [1], 'status': 'approved'}).status_code == 403
+
+
+def set_status(client, headers, document, status):
+    response = client.put(f'/api/documents/{document["id"]}/status', headers=headers, json={'status': status})
+    assert response.status_code == 200
+
+
+def test_pending_queue_and_count(client, register):
+    admin = register(client, 'admin')
+    alice = register(client, 'alice')
+    documents = [upload(client, alice, f'Document {i}', f'text {i}'.encode()) for i in range(4)]
+    own = upload(client, admin, 'Admin document', b'admin text')
+    for document in (documents[2], documents[0], documents[3], own):
+        set_status(client, admin, document, 'pending')
+    set_status(client, admin, documents[3], 'approved')
+
+    assert client.get('/api/documents/pending/count', headers=admin).get_json() == {'count': 3}
+    assert client.get('/api/documents/pending/count', headers=alice).get_json() == {'count': 2}
+    assert client.get('/api/documents/pending/count?type=other', headers=admin).get_json() == {'count': 0}
+
+    # Oldest submitted document first, one page at a time
+    response = client.get('/api/documents/pending?limit=2', headers=admin)
+    assert [item['title'] for item in response.get_json()['items']] == ['Document 0', 'Document 2']
+    cursor = response.get_json()['next_cursor']
+    response = client.get(f'/api/documents/pending?limit=2&cursor={cursor}', headers=admin)
+    assert [item['title'] for item in response.get_json()['items']] == ['Admin document']
+    assert response.get_json()['next_cursor'] is None
+
+
+def replace_file(client, headers, document, content, file_name):
+    response = client.put(f'/api/documents/{document["id"]}', headers=headers, content_type='multipart/form-data',
+                          data={'file': (io.BytesIO(content), file_name)})
+    assert response.status_code == 200
+
+
+def test_replaced_files_are_kept_as_versions(app, client, register):
+    headers = register(client, 'admin')
+    document = upload(client, headers, 'Notes', b'one\ntwo\nthree\n', 'notes.txt')
+    replace_file(client, headers, document, b'one\n2\nthree\n', 'notes-v2.txt')
+    replace_file(client, headers, document, b'one\n2\nthree\n', 'same-again.txt')  # Identical content
+    url = f'/api/documents/{document["id"]}/versions'
+
+    versions = client.get(url, headers=headers).get_json()['items']
+    assert [(version['version'], version['file_name']) for version in versions] == [(2, 'notes-v2.txt'),
+                                                                                    (1, 'notes.txt')]
+    assert client.get(f'{url}/1/file', headers=headers).data == b'one\ntwo\nthree\n'
+    assert client.get(f'{url}/3/file', headers=headers).status_code == 404
+    with app.app_context():
+        assert {blob.sha256: blob.ref_count for blob in Blob.query} == {version['file_hash']: 1 for version in versions}
+
+    response = client.get(f'{url}/diff?from=1&to=2', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['identical'] is False
+    assert response.get_json()['diff'].splitlines() == [
+        '--- version 1', '+++ version 2', '@@ -1,3 +1,3 @@', ' one', '-two', '+2', ' three'
+    ]
+    assert client.get(f'{url}/diff?from=2&to=2', headers=headers).get_json()['identical'] is True
+    assert client.get(f'{url}/diff?from=1&to=3', headers=headers).status_code == 404
+    assert client.get(f'{url}/diff?from=1', headers=headers).status_code == 400
@@ -0,0 +1,39 @@
+from app.pubsub import LocalBroker, get_broker, publish
+
+
+def open_stream(client, url, **kwargs):
+    response = client.get(url, buffered=False, **kwargs)
+    return response, iter(response.response)
+
+
+def test_stream_opens_with_ticket(app, client, register):
+    headers = register(client, 'admin')
+    ticket = client.post('/api/events/ticket', headers=headers).get_json()['ticket']
+
+    response, chunks = open_stream(client, f'/api/events?ticket={ticket}')
+    assert response.status_code == 200
+    with app.app_context():
+        publish([1], 'message', {'id': 7})
+    assert next(chunks).startswith(b'retry:')
+    assert next(chunks) == b'event: message\ndata: {"id":7}\n\n'
+    response.close()
+
+
+def test_stream_rejects_bad_ticket_and_query_string_jwt(client, register):
+    headers = register(client, 'admin')
+    token = headers['Authorization'].split()[1]
+
+    assert client.get('/api/events?ticket=forged').status_code == 401
+    assert client.get(f'/api/events?jwt={token}').status_code == 401
+
+
+def test_expired_ticket_is_rejected(make_app, register):
+    app = make_app(EVENT_TICKET_TTL=-1)
+    client = app.test_client()
+    ticket = client.post('/api/events/ticket', headers=register(client, 'admin')).get_json()['ticket']
+    assert client.get(f'/api/events?ticket={ticket}').status_code == 401
+
+
+def test_sqlite_uses_local_broker(app):
+    with app.app_context():
+        assert type(get_broker()) is LocalBroker
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from app import db
+from app.extraction import MAX_ATTEMPTS, STALE_AFTER, claim_next_job
+from app.models import Document, ExtractionJob, User
+
+
+def add_job(app, **values):
+    with app.app_context():
+        user = User(username='author', email='author@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        document = Document(title='Document', type='general', file_path='a.txt', file_name='a.txt',
+                            author_id=user.id, status='draft')
+        db.session.add(document)
+        db.session.flush()
+        job = ExtractionJob(document_id=document.id, file_path='a.txt', **values)
+        db.session.add(job)
+        db.session.commit()
+        return job.id
+
+
+def test_abandoned_job_is_claimed_again(app):
+    job_id = add_job(app, status='running', attempts=1, locked_at=datetime.utcnow() - STALE_AFTER * 2)
+    with app.app_context():
+        job = claim_next_job()
+        assert job.id == job_id
+        assert job.attempts == 2
+
+
+def test_abandoned_job_fails_after_max_attempts(app):
+    job_id = add_job(app, status='running', attempts=MAX_ATTEMPTS, locked_at=datetime.utcnow() - STALE_AFTER * 2)
+    with app.app_context():
+        assert claim_next_job() is None
+        job = db.session.get(ExtractionJob, job_id)
+        assert job.status == 'failed'
+        assert job.locked_at is None
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.history_archive import archive_history
+from app.models import DocumentHistory, DocumentHistoryArchive
+from tests.test_documents import upload
+
+
+def history_pages(client, headers, document_id, limit):
+    items, cursor = [], None
+    while True:
+        url = f'/api/documents/{document_id}/history?limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        items += response.get_json()['items']
+        cursor = response.get_json()['next_cursor']
+        if not cursor:
+            return items
+
+
+def test_history_pages_continue_into_the_archive(app, client, register):
+    headers = register(client, 'admin')
+    document = upload(client, headers, 'Report', b'text')
+    upload(client, headers, 'Other', b'other')
+    for i in range(7):
+        response = client.put(f'/api/documents/{document["id"]}', headers=headers, data={'reason': f'edit {i}'})
+        assert response.status_code == 200
+
+    # The creation and the first five edits are old enough to be archived
+    with app.app_context():
+        old = DocumentHistory.query.order_by(DocumentHistory.id).all()
+        for days, entry in enumerate(reversed([row for row in old if row.reason != 'edit 6']), start=40):
+            entry.timestamp = datetime.utcnow() - timedelta(days=days)
+        db.session.commit()
+        expected = [(row.id, row.reason) for row in DocumentHistory.query.filter_by(document_id=document['id'])
+                    .order_by(DocumentHistory.timestamp.desc(), DocumentHistory.id.desc())]
+
+        assert archive_history(older_than_days=30, segment_size=3) == 8
+        assert DocumentHistory.query.count() == 1
+        assert DocumentHistoryArchive.query.filter_by(document_id=document['id']).count() == 3
+
+    for limit in (1, 2, 3, 50):
+        items = history_pages(client, headers, document['id'], limit)
+        assert [(item['id'], item['reason']) for item in items] == expected
+        assert {item['user'] for item in items} == {'admin'}
@@ -0,0 +1,150 @@
+import hashlib
+import io
+import os
+import struct
+import zipfile
+
+from sqlalchemy import event, text
+
+from app import db
+from app.models import Blob
+
+CENTRAL_HEADER = b'PK\x01\x02'
+
+
+def patch_member(data, name, flags=None, method=None, corrupt=False):
+    # Edits the local and central directory headers of one member in place
+    data = bytearray(data)
+    encoded = name.encode()
+    with zipfile.ZipFile(io.BytesIO(bytes(data))) as archive:
+        info = archive.getinfo(name)
+    offset = info.header_offset
+    if flags is not None:
+        struct.pack_into('<H', data, offset + 6, flags)
+    if method is not None:
+        struct.pack_into('<H', data, offset + 8, method)
+    if corrupt:
+        name_length, extra_length = struct.unpack_from('<HH', data, offset + 26)
+        start = offset + 30 + name_length + extra_length
+        data[start:start + 8] = b'\xff' * 8
+    central = data.find(CENTRAL_HEADER)
+    while central != -1:
+        name_length = struct.unpack_from('<H', data, central + 28)[0]
+        if bytes(data[central + 46:central + 46 + name_length]) == encoded:
+            if flags is not None:
+                struct.pack_into('<H', data, central + 8, flags)
+            if method is not None:
+                struct.pack_into('<H', data, central + 10, method)
+        central = data.find(CENTRAL_HEADER, central + 46)
+    return bytes(data)
+
+
+def make_archive():
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name in ('good.txt', 'corrupt.txt', 'encrypted.txt', 'unsupported.txt'):
+            archive.writestr(name, f'{name} '.encode() * 2000)
+    data = patch_member(buffer.getvalue(), 'corrupt.txt', corrupt=True)
+    data = patch_member(data, 'encrypted.txt', flags=0x1)
+    return patch_member(data, 'unsupported.txt', method=99)
+
+
+def test_broken_zip_members_are_reported_per_item(client, register):
+    headers = register(client, 'admin')
+    response = client.post('/api/documents/import', headers=headers,
+                           data={'archive': (io.BytesIO(make_archive()), 'import.zip')})
+
+    assert response.status_code == 200
+    results = {result['file']: result for result in response.get_json()['results']}
+    assert results['good.txt']['status'] == 'created'
+    for name in ('corrupt.txt', 'encrypted.txt', 'unsupported.txt'):
+        assert results[name]['status'] == 'error'
+        assert results[name]['error'].startswith('Could not read file')
+
+
+def test_file_listed_twice_in_manifest_is_imported_twice(app, client, register):
+    headers = register(client, 'admin')
+    content = b'shared content ' * 10000
+    manifest = '[{"file": "a.txt", "title": "First"}, {"file": "a.txt", "title": "Second"}, ' \
+               '{"file": "missing.txt", "title": "Missing"}]'
+    response = client.post('/api/documents/import', headers=headers, data={
+        'files': [(io.BytesIO(content), 'a.txt')], 'manifest': manifest
+    })
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['created', 'created', 'error']
+
+    from app.models import Document
+    with app.app_context():
+        documents = Document.query.order_by(Document.id).all()
+        assert [document.file_hash for document in documents] == [hashlib.sha256(content).hexdigest()] * 2
+    assert os.listdir(os.path.join(app.config['UPLOAD_FOLDER'], '.incoming')) == []
+
+
+def test_content_stored_concurrently_is_counted_on_its_row(app, client, register):
+    headers = register(client, 'admin')
+    content = b'raced content'
+    sha256 = hashlib.sha256(content).hexdigest()
+
+    # Another request stores the same content between the import's lookup and its insert
+    def store_first(connection, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO blobs') and not raced:
+            raced.append(True)
+            with db.engine.begin() as other:
+                other.execute(text("INSERT INTO blobs (sha256, size, ref_count) VALUES (:sha256, :size, 1)"),
+                              {'sha256': sha256, 'size': len(content)})
+
+    raced = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', store_first)
+    try:
+        response = client.post('/api/documents/import', headers=headers, data={
+            'files': [(io.BytesIO(content), 'a.txt')]
+        })
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'before_cursor_execute', store_first)
+
+    assert raced
+    assert response.get_json()['created'] == 1
+    with app.app_context():
+        assert db.session.get(Blob, sha256).ref_count == 2
+
+
+def upload_archive(client, headers, data):
+    response = client.post('/api/documents/uploads', headers=headers,
+                           json={'title': 'Batch', 'file_name': 'batch.zip', 'size': len(data)})
+    upload_id = response.get_json()['upload_id']
+    response = client.put(f'/api/documents/uploads/{upload_id}', data=data,
+                          headers={**headers, 'Content-Range': f'bytes 0-{len(data) - 1}/{len(data)}'})
+    assert response.status_code == 200, response.get_json()
+    return upload_id
+
+
+def test_rejected_import_keeps_the_resumable_upload(client, register):
+    headers = register(client, 'admin')
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('a.txt', b'a')
+    upload_id = upload_archive(client, headers, buffer.getvalue())
+
+    response = client.post('/api/documents/import', headers=headers,
+                           json={'upload_id': upload_id, 'manifest': '{not json'})
+    assert response.status_code == 400
+    assert client.get(f'/api/documents/uploads/{upload_id}', headers=headers).status_code == 200
+
+    # The retry uses the same upload, which is consumed once accepted
+    response = client.post('/api/documents/import', headers=headers, json={'upload_id': upload_id})
+    assert response.status_code == 200
+    assert response.get_json()['created'] == 1
+    assert client.get(f'/api/documents/uploads/{upload_id}', headers=headers).status_code == 404
+
+
+def test_corrupt_uploaded_archive_is_kept(client, register):
+    headers = register(client, 'admin')
+    upload_id = upload_archive(client, headers, b'not a zip archive')
+
+    response = client.post('/api/documents/import', headers=headers, json={'upload_id': upload_id})
+    assert response.status_code == 400
+    assert client.get(f'/api/documents/uploads/{upload_id}', headers=headers).get_json()['received'] == 17
@@ -0,0 +1,84 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, update
+
+from app import db
+from app.models import Document, Message, User
+from app.user_cache import get_user_cache
+
+
+@contextmanager
+def count_statements(app):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def add_rows(app, count, recipient_id):
+    # Every row has its own author, so a per-row user lookup would show up as N extra queries
+    with app.app_context():
+        users = [User(username=f'user{i}', email=f'user{i}@example.com', password_hash='x') for i in range(count)]
+        db.session.add_all(users)
+        db.session.flush()
+        for i, user in enumerate(users):
+            db.session.add(Document(title=f'Document {i}', type='general', file_path=f'{i}.txt', file_name=f'{i}.txt',
+                                    author_id=user.id, status='draft'))
+            db.session.add(Message(sender_id=user.id, recipient_id=recipient_id, subject=f'Subject {i}', body='Body'))
+        db.session.commit()
+
+
+def list_query_count(app, client, headers, url):
+    with app.app_context():
+        get_user_cache().clear()  # Cold cache: usernames have to come from the database
+    with count_statements(app) as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return len(response.get_json()['items']), len(statements)
+
+
+@pytest.mark.parametrize('url', ['/api/documents?limit={n}', '/api/messages?limit={n}'])
+def test_list_query_count_does_not_depend_on_page_size(app, client, register, url):
+    headers = register(client, 'admin')
+    add_rows(app, 20, recipient_id=1)
+
+    small_items, small_count = list_query_count(app, client, headers, url.format(n=5))
+    large_items, large_count = list_query_count(app, client, headers, url.format(n=20))
+
+    assert (small_items, large_items) == (5, 20)
+    assert 0 < small_count == large_count
+
+
+@pytest.mark.parametrize('sort_dir', ['asc', 'desc'])
+def test_paging_through_null_sort_values(app, client, register, sort_dir):
+    headers = register(client, 'admin')
+    with app.app_context():
+        for i, status in enumerate([None, 'draft', None, 'approved', None, None, 'draft', None]):
+            db.session.add(Document(title=f'Document {i}', type='general', file_path=f'{i}.txt', file_name=f'{i}.txt',
+                                    author_id=1, status=status))
+        db.session.flush()
+        # The column default fills in a missing status, so the NULLs are written afterwards
+        db.session.execute(update(Document).where(Document.title.in_(
+            [f'Document {i}' for i in (0, 2, 4, 5, 7)])).values(status=None))
+        db.session.commit()
+
+    seen, cursor = [], None
+    while True:
+        url = f'/api/documents?sort_by=status&sort_dir={sort_dir}&limit=3'
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''), headers=headers)
+        assert response.status_code == 200
+        seen += [item['id'] for item in response.get_json()['items']]
+        cursor = response.get_json()['next_cursor']
+        if not cursor:
+            break
+
+    assert sorted(seen) == list(range(1, 9))
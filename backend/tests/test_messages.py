@@ -0,0 +1,61 @@
+from sqlalchemy import text
+
+from app import db
+from app.user_cache import get_user_cache
+
+
+def test_reply_to_deleted_participant_is_not_found(app, client, register):
+    alice = register(client, 'alice')
+    register(client, 'bob')
+    response = client.post('/api/messages', headers=alice,
+                           json={'recipient': 'bob', 'subject': 'Hello', 'body': 'First'})
+    assert response.status_code == 201
+    message_id = response.get_json()['message_data']['id']
+
+    with app.app_context():
+        # Removed outside the ORM, which would otherwise try to detach bob's messages
+        db.session.execute(text("DELETE FROM users WHERE username = 'bob'"))
+        db.session.commit()
+        get_user_cache().clear()
+
+    response = client.post('/api/messages', headers=alice, json={'parent_id': message_id, 'body': 'Still there?'})
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Recipient not found'}
+
+
+def send(client, headers, recipient, subject):
+    response = client.post('/api/messages', headers=headers,
+                           json={'recipient': recipient, 'subject': subject, 'body': 'b'})
+    assert response.status_code == 201
+    return response.get_json()['message_data']
+
+
+def unread_count(client, headers):
+    response = client.get('/api/messages/unread_count', headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['count']
+
+
+def test_unread_count_follows_reads(client, register):
+    alice = register(client, 'alice')
+    bob = register(client, 'bob')
+    first = send(client, alice, 'bob', 'First')
+    second = send(client, alice, 'bob', 'Second')
+    send(client, alice, 'bob', 'Third')
+    send(client, bob, 'alice', 'Reply')
+    assert (unread_count(client, alice), unread_count(client, bob)) == (1, 3)
+
+    # Reading a message twice or by its sender changes nothing
+    assert client.get(f'/api/messages/{first["id"]}', headers=bob).status_code == 200
+    assert client.get(f'/api/messages/{first["id"]}', headers=bob).status_code == 200
+    assert client.get(f'/api/messages/{second["id"]}', headers=alice).status_code == 200
+    assert unread_count(client, bob) == 2
+    assert client.put(f'/api/messages/{second["id"]}/read', headers=bob).status_code == 200
+    assert client.put(f'/api/messages/{second["id"]}/read', headers=bob).status_code == 200
+    assert unread_count(client, bob) == 1
+
+    response = client.put('/api/messages/read_all', headers=bob)
+    assert response.get_json()['updated'] == 1
+    assert (unread_count(client, alice), unread_count(client, bob)) == (1, 0)
+    assert client.put('/api/messages/read_all', headers=bob).get_json()['updated'] == 0
+    assert unread_count(client, bob) == 0
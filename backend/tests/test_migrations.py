@@ -0,0 +1,57 @@
+import os
+
+import flask_migrate
+from sqlalchemy import text
+
+from app import db
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+def search_messages(client, headers, word):
+    response = client.get(f'/api/messages?folder=sent&search={word}', headers=headers)
+    assert response.status_code == 200
+    return [message['subject'] for message in response.get_json()['items']]
+
+
+def test_message_search_works_after_upgrade(make_app, register):
+    app = make_app(create_tables=False)
+    with app.app_context():
+        flask_migrate.upgrade(MIGRATIONS)
+    client = app.test_client()
+    headers = register(client, 'alice')
+    register(client, 'bob')
+
+    response = client.post('/api/messages', headers=headers,
+                           json={'recipient': 'bob', 'subject': 'Quarterly budget', 'body': 'See attached'})
+    assert response.status_code == 201
+    assert search_messages(client, headers, 'budget') == ['Quarterly budget']
+
+
+def test_message_search_triggers_survive_threads_downgrade(make_app):
+    app = make_app(create_tables=False)
+    with app.app_context():
+        flask_migrate.upgrade(MIGRATIONS, revision='a7c93b5a560f')
+        flask_migrate.downgrade(MIGRATIONS, revision='2320943d8a88')
+        db.session.execute(text("INSERT INTO users (id, username, email, password_hash, role, unread_count) "
+                                "VALUES (1, 'alice', 'alice@example.com', 'x', 'user', 0)"))
+        db.session.execute(text("INSERT INTO messages (sender_id, recipient_id, subject, body) "
+                                "VALUES (1, 1, 'Quarterly budget', 'See attached')"))
+        db.session.commit()
+        found = db.session.execute(text("SELECT count(*) FROM messages_fts WHERE messages_fts MATCH 'budget'")).scalar()
+    assert found == 1
+
+
+def test_document_search_triggers_survive_blob_store_downgrade(make_app):
+    app = make_app(create_tables=False)
+    with app.app_context():
+        flask_migrate.upgrade(MIGRATIONS, revision='1d7440da6975')
+        flask_migrate.downgrade(MIGRATIONS, revision='fdc76df015c7')
+        db.session.execute(text("INSERT INTO users (id, username, email, password_hash, role) "
+                                "VALUES (1, 'alice', 'alice@example.com', 'x', 'user')"))
+        db.session.execute(text("INSERT INTO documents (title, type, file_path, author_id, content) "
+                                "VALUES ('Quarterly budget', 'report', 'a.txt', 1, 'numbers')"))
+        db.session.commit()
+        found = db.session.execute(
+            text("SELECT count(*) FROM documents_fts WHERE documents_fts MATCH 'budget'")).scalar()
+    assert found == 1
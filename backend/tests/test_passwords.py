@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from app import passwords
+from app.models import User
+
+
+@pytest.fixture
+def pooled_app(make_app):
+    # A real process pool; shut down after the test so it does not leak into others
+    def factory(**overrides):
+        return make_app(PASSWORD_HASH_WORKERS=1, **overrides)
+
+    yield factory
+    passwords.shutdown_executor()
+
+
+def test_hash_timeout_is_reported_as_busy(pooled_app):
+    app = pooled_app(PASSWORD_HASH_TIMEOUT=0.001)  # Far less than starting a worker and hashing
+    client = app.test_client()
+
+    response = client.post('/api/auth/register',
+                           json={'username': 'alice', 'email': 'alice@example.com', 'password': 'password'})
+
+    assert response.status_code == 503
+    assert response.get_json() == {'error': 'Server is busy, please try again'}
+
+
+def test_broken_pool_is_replaced(pooled_app):
+    app = pooled_app(PASSWORD_HASH_TIMEOUT=30)
+    with app.app_context():
+        with pytest.raises(passwords.PasswordHasherBusy):
+            passwords._run(os._exit, 1)  # The worker process dies
+        assert passwords._executor is None
+
+        password_hash = passwords.hash_password('password')
+        assert passwords.verify_password(password_hash, 'password')
+
+
+def test_spawned_workers_do_not_create_the_app():
+    # Spawned pool workers import the main module again; python run.py must not build an app there
+    import run
+    assert not hasattr(run, 'app')
+
+
+def password_hash(app, username):
+    with app.app_context():
+        return User.query.filter_by(username=username).one().password_hash
+
+
+def login(client, username, password='password'):
+    return client.post('/api/auth/login', json={'username': username, 'password': password}).status_code
+
+
+def test_login_upgrades_hashes_of_an_older_cost(make_app, register):
+    old = make_app(PASSWORD_HASH_METHOD='pbkdf2:sha256:1000')
+    register(old.test_client(), 'alice')
+    assert password_hash(old, 'alice').startswith('pbkdf2:sha256:1000$')
+
+    app = make_app(PASSWORD_HASH_METHOD='pbkdf2:sha256:2000')
+    client = app.test_client()
+    assert login(client, 'alice', 'wrong') == 401
+    assert password_hash(app, 'alice').startswith('pbkdf2:sha256:1000$')
+    assert login(client, 'alice') == 200
+    upgraded = password_hash(app, 'alice')
+    assert upgraded.startswith('pbkdf2:sha256:2000$')
+
+    # A hash of the current cost is left alone
+    assert login(client, 'alice') == 200
+    assert password_hash(app, 'alice') == upgraded
+
+
+def test_register_and_login_through_the_pool(pooled_app, register):
+    app = pooled_app(PASSWORD_HASH_METHOD='pbkdf2:sha256:1000', PASSWORD_HASH_TIMEOUT=30)
+    client = app.test_client()
+    register(client, 'alice')
+
+    assert passwords._executor is not None
+    assert login(client, 'alice') == 200
+    assert login(client, 'alice', 'wrong') == 401
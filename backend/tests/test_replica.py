@@ -0,0 +1,50 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from app import db
+from app.models import UserWrite
+
+
+def replicate(primary_path, replica_path):
+    # Stands in for replication: the replica becomes a copy of the primary as of now
+    source, target = sqlite3.connect(primary_path), sqlite3.connect(replica_path)
+    with target:
+        source.backup(target)
+    source.close()
+    target.close()
+
+
+def message_subjects(client, headers, folder):
+    response = client.get(f'/api/messages?folder={folder}', headers=headers)
+    assert response.status_code == 200
+    return [message['subject'] for message in response.get_json()['items']]
+
+
+def test_reads_stick_to_the_primary_after_own_write(make_app, register, tmp_path):
+    overrides = {'REPLICA_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'replica.sqlite'),
+                 'REPLICA_STICKY_SECONDS': 60}
+    app = make_app(**overrides)
+    client = app.test_client()
+    alice = register(client, 'alice')
+    bob = register(client, 'bob')
+    replicate(tmp_path / 'db.sqlite', tmp_path / 'replica.sqlite')
+
+    response = client.post('/api/messages', headers=alice, json={'recipient': 'bob', 'subject': 'Hi', 'body': 'b'})
+    assert response.status_code == 201
+
+    # Bob has not written anything, so he reads the replica, which has not caught up yet
+    assert message_subjects(client, bob, 'inbox') == []
+    # Alice sees her own write, also from another server process and without any cookie
+    other_process = make_app(**overrides).test_client()
+    assert message_subjects(other_process, alice, 'sent') == ['Hi']
+
+    # Once the sticky window has passed, alice reads the replica again
+    with app.app_context():
+        db.session.execute(update(UserWrite).values(written_at=datetime.utcnow() - timedelta(minutes=5)))
+        db.session.commit()
+    assert message_subjects(client, alice, 'sent') == []
+
+    replicate(tmp_path / 'db.sqlite', tmp_path / 'replica.sqlite')
+    assert message_subjects(client, bob, 'inbox') == ['Hi']
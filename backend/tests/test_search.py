@@ -0,0 +1,43 @@
+from app import db
+from app.models import Document
+from tests.test_documents import upload
+
+
+def search(client, headers, query):
+    response = client.get('/api/documents/search', headers=headers, query_string={'q': query})
+    assert response.status_code == 200, response.get_json()
+    return [item['title'] for item in response.get_json()['items']]
+
+
+def test_title_matches_rank_above_content_matches(app, client, register):
+    headers = register(client, 'admin')
+    in_content = upload(client, headers, 'Minutes', b'x')
+    upload(client, headers, 'Budget plan', b'x')
+    upload(client, headers, 'Unrelated', b'x')
+    with app.app_context():
+        # The index follows content written later, e.g. by the extraction worker
+        db.session.get(Document, in_content['id']).content = 'The budget was discussed'
+        db.session.commit()
+
+    assert search(client, headers, 'budget') == ['Budget plan', 'Minutes']
+    assert search(client, headers, 'budg') == ['Budget plan', 'Minutes']
+    assert search(client, headers, 'budget plan') == ['Budget plan']
+
+
+def test_search_input_is_not_parsed_as_query_syntax(client, register):
+    headers = register(client, 'admin')
+    upload(client, headers, 'Budget plan', b'x')
+
+    assert search(client, headers, '"budget* OR (NEAR') == []
+    assert search(client, headers, 'budget -plan') == ['Budget plan']
+    assert client.get('/api/documents/search?q=', headers=headers).status_code == 400
+
+
+def test_users_only_find_their_own_documents(client, register):
+    admin = register(client, 'admin')
+    alice = register(client, 'alice')
+    upload(client, admin, 'Budget for admins', b'x')
+    upload(client, alice, 'Budget for alice', b'x')
+
+    assert search(client, alice, 'budget') == ['Budget for alice']
+    assert sorted(search(client, admin, 'budget')) == ['Budget for admins', 'Budget for alice']
@@ -0,0 +1,73 @@
+import io
+import json
+import zipfile
+
+from sqlalchemy import func
+
+from app import db
+from app.document_stats import rebuild_stats
+from app.models import Document, DocumentStat
+from tests.test_documents import set_status, upload
+
+
+def counted_stats(app):
+    with app.app_context():
+        return {(row.author_id, row.status, row.type): row.count for row in DocumentStat.query if row.count}
+
+
+def recounted_stats(app):
+    with app.app_context():
+        rows = db.session.query(Document.author_id, func.coalesce(Document.status, ''), Document.type,
+                                func.count(Document.id)).group_by(Document.author_id, Document.status, Document.type)
+        return {(author_id, status, document_type): count for author_id, status, document_type, count in rows}
+
+
+def test_every_write_path_keeps_the_stats_exact(app, client, register):
+    admin = register(client, 'admin')
+    alice = register(client, 'alice')
+
+    def check():
+        assert counted_stats(app) == recounted_stats(app)
+
+    first = upload(client, alice, 'First', b'first')
+    second = upload(client, alice, 'Second', b'second')
+    check()
+
+    session = client.post('/api/documents/uploads', headers=alice,
+                          json={'title': 'Chunked', 'file_name': 'chunked.txt', 'size': 0, 'type': 'report'})
+    assert client.post(f'/api/documents/uploads/{session.get_json()["upload_id"]}/complete',
+                       headers=alice).status_code == 201
+    check()
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zip_file:
+        zip_file.writestr('a.txt', 'a')
+        zip_file.writestr('b.txt', 'b')
+    manifest = json.dumps([{'file': 'a.txt', 'title': 'A', 'type': 'report'}, {'file': 'b.txt', 'title': 'B'}])
+    response = client.post('/api/documents/import', headers=alice,
+                           data={'archive': (io.BytesIO(archive.getvalue()), 'import.zip'), 'manifest': manifest})
+    assert response.get_json()['created'] == 2
+    check()
+
+    response = client.put(f'/api/documents/{first["id"]}', headers=alice, data={'type': 'report', 'status': 'review'})
+    assert response.status_code == 200
+    check()
+
+    set_status(client, admin, second, 'approved')
+    check()
+
+    response = client.put('/api/documents/status', headers=admin, json={'ids': [first['id'], second['id']],
+                                                                          'status': 'rejected'})
+    assert response.status_code == 200
+    check()
+
+    response = client.get('/api/stats', headers=alice).get_json()
+    assert response['total'] == 5
+    assert response['by_status'] == {'draft': 3, 'rejected': 2}
+    assert response['by_type'] == {'general': 2, 'report': 3}
+
+    # The rebuild script arrives at the same numbers
+    before = counted_stats(app)
+    with app.app_context():
+        rebuild_stats()
+    assert counted_stats(app) == before
@@ -0,0 +1,56 @@
+import hashlib
+import os
+
+from app import db
+from app.models import Blob
+from app.storage import INCOMING_DIR, blob_path
+from tests.test_documents import upload
+
+
+def stored_files(upload_folder):
+    return sorted(os.path.relpath(os.path.join(folder, name), upload_folder)
+                  for folder, _, names in os.walk(upload_folder) for name in names)
+
+
+def test_identical_uploads_share_one_blob(app, client, register):
+    headers = register(client, 'admin')
+    content = b'the same bytes'
+    sha256 = hashlib.sha256(content).hexdigest()
+
+    first = upload(client, headers, 'First', content, 'first.txt')
+    second = upload(client, headers, 'Second', content, 'second.txt')
+    upload(client, headers, 'Other', b'other bytes')
+
+    assert first['file_path'] == second['file_path'] == blob_path(sha256)
+    upload_folder = app.config['UPLOAD_FOLDER']
+    other = blob_path(hashlib.sha256(b'other bytes').hexdigest())
+    assert stored_files(upload_folder) == sorted([blob_path(sha256), other])
+    assert os.listdir(os.path.join(upload_folder, INCOMING_DIR)) == []
+    with app.app_context():
+        assert db.session.get(Blob, sha256).ref_count == 2
+
+    # Each document keeps its own download name
+    response = client.get(f'/api/documents/{second["id"]}/file', headers=headers)
+    assert response.data == content
+    assert 'second.txt' in response.headers['Content-Disposition']
+
+
+def test_resumable_upload_reuses_stored_content(app, client, register):
+    headers = register(client, 'admin')
+    content = b'uploaded in two parts'
+    upload(client, headers, 'Direct', content)
+
+    session = client.post('/api/documents/uploads', headers=headers,
+                          json={'title': 'Chunked', 'file_name': 'chunked.txt', 'size': len(content)}).get_json()
+    for start, end in ((0, 9), (10, len(content) - 1)):
+        response = client.put(f'/api/documents/uploads/{session["upload_id"]}', data=content[start:end + 1],
+                              headers={**headers, 'Content-Range': f'bytes {start}-{end}/{len(content)}'})
+        assert response.status_code == 200
+    response = client.post(f'/api/documents/uploads/{session["upload_id"]}/complete', headers=headers)
+    assert response.status_code == 201
+
+    sha256 = hashlib.sha256(content).hexdigest()
+    assert response.get_json()['document']['file_hash'] == sha256
+    assert stored_files(app.config['UPLOAD_FOLDER']) == [blob_path(sha256)]
+    with app.app_context():
+        assert db.session.get(Blob, sha256).ref_count == 2
@@ -0,0 +1,84 @@
+from unittest import mock
+
+from flask import g
+from sqlalchemy import update
+
+from app import db
+from app.models import User
+from app.user_cache import get_user_cache
+from tests.test_replica import replicate
+
+
+def profile_theme(client, headers):
+    response = client.get('/api/auth/profile', headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['theme']
+
+
+def test_settings_update_invalidates_the_cached_profile(app, client, register):
+    alice = register(client, 'alice')
+    original = profile_theme(client, alice)
+    theme = 'dark' if original != 'dark' else 'light'
+
+    assert client.put('/api/auth/settings', headers=alice, json={'theme': theme}).status_code == 200
+    assert profile_theme(client, alice) == theme
+    with app.app_context():
+        assert get_user_cache().stats()['hits'] == 0
+
+
+def test_profile_sees_changes_made_by_another_process(make_app, register):
+    client = make_app().test_client()
+    alice = register(client, 'alice')
+    profile_theme(client, alice)
+
+    # Another server process has a cache of its own, so this process gets no invalidation
+    other_process = make_app().test_client()
+    assert other_process.put('/api/auth/settings', headers=alice, json={'theme': 'sepia'}).status_code == 200
+    assert profile_theme(client, alice) == 'sepia'
+
+
+def test_cache_is_never_filled_from_the_replica(make_app, register, tmp_path):
+    app = make_app(REPLICA_DATABASE_URI='sqlite:///' + str(tmp_path / 'replica.sqlite'))
+    client = app.test_client()
+    register(client, 'alice')
+    replicate(tmp_path / 'db.sqlite', tmp_path / 'replica.sqlite')
+    with app.app_context():
+        db.session.execute(update(User).where(User.username == 'alice').values(role='admin', theme='sepia'))
+        db.session.commit()
+        get_user_cache().clear()
+
+    # The replica still has the old row; a route reading from it caches the primary's one
+    with app.test_request_context():
+        g.use_replica = True
+        assert User.query.filter_by(username='alice').one().theme != 'sepia'
+        assert get_user_cache().get_by_username('alice')['theme'] == 'sepia'
+    with app.test_request_context():
+        user_id = get_user_cache().get_by_username('alice')['id']
+        assert get_user_cache().get(user_id)['theme'] == 'sepia'
+
+
+def test_records_are_evicted_expired_and_invalidated(make_app, register):
+    app = make_app(USER_CACHE_SIZE=2, USER_CACHE_TTL=60)
+    client = app.test_client()
+    for username in ('alice', 'bob', 'carol'):
+        register(client, username)
+
+    with app.app_context():
+        cache = get_user_cache()
+        cache.clear()
+        assert set(cache.get_many([1, 2, 3])) == {1, 2, 3}
+        assert cache.stats()['size'] == 2 and cache.stats()['evictions'] == 1
+
+        # A renamed user is found only under the new name
+        user = db.session.get(User, cache.get_by_username('bob')['id'])
+        user.username = 'robert'
+        db.session.commit()
+        assert cache.get_by_username('bob') is None
+        assert cache.get_by_username('robert')['id'] == user.id
+
+        hits = cache.stats()['hits']
+        assert cache.get(user.id)['username'] == 'robert'
+        assert cache.stats()['hits'] == hits + 1
+        with mock.patch('app.user_cache.time.monotonic', return_value=10 ** 9):
+            assert cache.get(user.id)['username'] == 'robert'
+        assert cache.stats()['hits'] == hits + 1
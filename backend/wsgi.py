@@ -0,0 +1,7 @@
+# --- Точка входа WSGI ---
+# Приложение создаётся при импорте: gunicorn -c gunicorn.conf.py wsgi:app.
+# run.py создаёт его только под __main__, потому что процессы пула хеширования паролей
+# запускаются через spawn и заново импортируют главный модуль
+from app import create_app
+
+app = create_app()